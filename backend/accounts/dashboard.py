@@ -0,0 +1,103 @@
+"""Aggregates behind the agent dashboard (AgentProfileViewSet.dashboard).
+
+Every section is one aggregate or one bounded list query, so the dashboard
+costs the same handful of queries whatever the size of the agent's portfolio.
+"""
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from messaging.models import Conversation
+from payments.models import Payment
+from properties.models import STATUS_CHOICES, Property, PropertyVisit
+from properties.visits import ACTIVE_STATUSES
+
+# Payment.status values that mean the money arrived (the M-Pesa callback writes 'success')
+PAID_STATUSES = ('confirmed', 'completed', 'success')
+
+# Length of each list section
+DASHBOARD_LIST_SIZE = 20
+
+
+def listing_summary(user):
+    counts = {f'status_{value}': Count('id', filter=Q(status=value)) for value, _ in STATUS_CHOICES}
+    totals = Property.objects.filter(owner=user).aggregate(
+        total=Count('id'),
+        published=Count('id', filter=Q(is_published=True)),
+        views=Sum('view_count'),
+        **counts,
+    )
+    return {
+        'total': totals['total'],
+        'published': totals['published'],
+        'by_status': {value: totals[f'status_{value}'] for value, _ in STATUS_CHOICES},
+        'total_views': totals['views'] or 0,
+    }
+
+
+def top_listings(user):
+    return list(
+        Property.objects.filter(owner=user).order_by('-view_count', '-id')
+        .values('id', 'title', 'status', 'is_published', 'view_count')[:DASHBOARD_LIST_SIZE]
+    )
+
+
+def upcoming_visits(user, now):
+    visits = (
+        PropertyVisit.objects.filter(property__owner=user, scheduled_time__gte=now, status__in=ACTIVE_STATUSES)
+        .select_related('property', 'visitor').order_by('scheduled_time')[:DASHBOARD_LIST_SIZE]
+    )
+    return [
+        {
+            'id': visit.id,
+            'property': visit.property_id,
+            'property_title': visit.property.title,
+            'visitor_username': visit.visitor.username,
+            'scheduled_time': visit.scheduled_time,
+            'status': visit.status,
+        }
+        for visit in visits
+    ]
+
+
+def open_conversations(user):
+    conversations = Conversation.objects.filter(property__owner=user, is_active=True)
+    recent = list(
+        conversations.annotate(message_count=Count('messages'))
+        .order_by('-updated_at')
+        .values('id', 'property_id', 'property__title', 'updated_at', 'message_count')[:DASHBOARD_LIST_SIZE]
+    )
+    return {
+        'count': conversations.count(),
+        'recent': [
+            {
+                'id': c['id'], 'property': c['property_id'], 'property_title': c['property__title'],
+                'updated_at': c['updated_at'], 'message_count': c['message_count'],
+            }
+            for c in recent
+        ],
+    }
+
+
+def revenue(user):
+    totals = Payment.objects.filter(property__owner=user).aggregate(
+        received=Sum('amount', filter=Q(status__in=PAID_STATUSES)),
+        pending=Sum('amount', filter=Q(status='pending')),
+        payments=Count('id', filter=Q(status__in=PAID_STATUSES)),
+    )
+    return {
+        'received': str(totals['received'] or 0),
+        'pending': str(totals['pending'] or 0),
+        'payments': totals['payments'],
+    }
+
+
+def agent_dashboard(user):
+    now = timezone.now()
+    return {
+        'listings': listing_summary(user),
+        'top_listings': top_listings(user),
+        'upcoming_visits': upcoming_visits(user, now),
+        'open_conversations': open_conversations(user),
+        'revenue': revenue(user),
+        'generated_at': now,
+    }
@@ -78,5 +78,8 @@ class AgentProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'user_email', 'user_username', 'first_name', 'last_name']
     
     def get_property_count(self, obj):
+        # annotated by AgentProfileViewSet.get_queryset; count only for bare instances
+        if hasattr(obj, 'property_count'):
+            return obj.property_count
         from properties.models import Property
         return Property.objects.filter(owner=obj.user).count()
\ No newline at end of file
@@ -1,3 +1,70 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Profile
+from messaging.models import Conversation
+from payments.models import Payment
+from properties.models import AgentProfile, PropertyVisit
+from properties.tests import make_property
+
+
+class AgentDashboardTest(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user(username='dash_agent', password='pass')
+        self.buyer = User.objects.create_user(username='dash_buyer', password='pass')
+        profile, _ = Profile.objects.get_or_create(user=self.agent)
+        self.agent_profile, _ = AgentProfile.objects.get_or_create(user=self.agent, profile=profile)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def make_listing(self, title, **extra):
+        return make_property(self.agent, title=title, **extra)
+
+    def dashboard(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/accounts/agent-profiles/{self.agent_profile.pk}/dashboard/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(queries)
+
+    def add_activity(self, listing):
+        PropertyVisit.objects.create(property=listing, visitor=self.buyer, scheduled_time=timezone.now() + timedelta(days=1))
+        PropertyVisit.objects.create(property=listing, visitor=self.buyer, scheduled_time=timezone.now() - timedelta(days=1))
+        conversation = Conversation.objects.create(property=listing)
+        conversation.participants.add(self.agent, self.buyer)
+        Payment.objects.create(user=self.buyer, property=listing, method='mpesa', amount=250, status='success')
+        Payment.objects.create(user=self.buyer, property=listing, method='mpesa', amount=75, status='pending')
+
+    def test_dashboard_aggregates_and_fixed_query_count(self):
+        popular = self.make_listing('Popular', view_count=40, is_published=True)
+        self.make_listing('Sold', status='sold', view_count=2)
+        self.add_activity(popular)
+
+        data, few = self.dashboard()
+        self.assertEqual(data['listings']['total'], 2)
+        self.assertEqual(data['listings']['by_status']['sold'], 1)
+        self.assertEqual(data['listings']['total_views'], 42)
+        self.assertEqual(data['top_listings'][0]['title'], 'Popular')
+        self.assertEqual(len(data['upcoming_visits']), 1)
+        self.assertEqual(data['open_conversations']['count'], 1)
+        self.assertEqual(data['revenue']['received'], '250.00')
+        self.assertEqual(data['revenue']['pending'], '75.00')
+
+        for i in range(10):
+            self.add_activity(self.make_listing(f'Listing {i}'))
+        _, many = self.dashboard()
+        self.assertEqual(few, many)
 
-# Create your tests here.
+    def test_agent_list_counts_properties_without_per_row_queries(self):
+        self.make_listing('One')
+        self.make_listing('Two')
+        response = self.client.get('/api/accounts/agent-profiles/')
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()
+        results = results['results'] if isinstance(results, dict) else results
+        self.assertEqual(results[0]['property_count'], 2)
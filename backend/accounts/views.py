@@ -3,7 +3,7 @@ from django.contrib.auth.models import User, Group
 from django.contrib.auth.decorators import login_required
 from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
@@ -16,6 +16,7 @@ from properties.models import AgentProfile, Property
 from .serializers import UserSerializer, UserProfileSerializer, AgentProfileSerializer
 from .forms import SignupForm, ActivationForm
 from .roles import get_user_role
+from .dashboard import agent_dashboard
 
 
 class UserManagementViewSet(viewsets.ReadOnlyModelViewSet):
@@ -140,10 +141,12 @@ class AgentProfileViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
+        # property_count is annotated here instead of counted per row in the serializer
+        queryset = AgentProfile.objects.select_related('user').annotate(property_count=Count('user__properties'))
         if self.request.user.is_superuser:
-            return AgentProfile.objects.all()
+            return queryset
         else:
-            return AgentProfile.objects.filter(user=self.request.user)
+            return queryset.filter(user=self.request.user)
     
     def get_object(self):
         if self.request.user.is_superuser:
@@ -163,6 +166,12 @@ class AgentProfileViewSet(viewsets.ModelViewSet):
         
         return Response({'message': f"Agent {agent_profile.user.username} has been verified"})
     
+    @action(detail=True, methods=['get'])
+    def dashboard(self, request, pk=None):
+        """Listing, view, visit, conversation and revenue figures for one agent"""
+        agent_profile = self.get_object()
+        return Response(agent_dashboard(agent_profile.user))
+
     @action(detail=True, methods=['post'])
     def activate_subscription(self, request, pk=None):
         """Activate agent subscription (admin only)"""
@@ -284,6 +284,35 @@ CACHES = {
     }
 }
 
+# Facet counts for the property search sidebar are cached per filter set
+PROPERTY_FACETS_TIMEOUT = int(os.getenv('PROPERTY_FACETS_TIMEOUT', 60 * 5))
+
+# Longest time the ranked featured-listings carousel is served from cache
+PROPERTY_FEATURED_TIMEOUT = int(os.getenv('PROPERTY_FEATURED_TIMEOUT', 60 * 15))
+
+# Maximum number of ranked full-text matches returned for ?q= property searches
+PROPERTY_SEARCH_MAX_RESULTS = int(os.getenv('PROPERTY_SEARCH_MAX_RESULTS', 1000))
+
+# Seconds between batched writes of buffered property view counts
+PROPERTY_VIEW_FLUSH_INTERVAL = int(os.getenv('PROPERTY_VIEW_FLUSH_INTERVAL', 30))
+
+# Worker processes resizing uploaded property images (0 resizes inline, e.g. in development)
+PROPERTY_IMAGE_WORKERS = int(os.getenv('PROPERTY_IMAGE_WORKERS', 2))
+
+# Length of a property viewing and the daily window (local hours) offered for booking
+PROPERTY_VISIT_DURATION_MINUTES = int(os.getenv('PROPERTY_VISIT_DURATION_MINUTES', 30))
+PROPERTY_VISIT_DAY_START = int(os.getenv('PROPERTY_VISIT_DAY_START', 8))
+PROPERTY_VISIT_DAY_END = int(os.getenv('PROPERTY_VISIT_DAY_END', 18))
+
+# Chunked video uploads: partial files live outside MEDIA_ROOT until complete
+PROPERTY_UPLOAD_TEMP_DIR = os.getenv('PROPERTY_UPLOAD_TEMP_DIR', str(BASE_DIR / 'upload_tmp'))
+PROPERTY_VIDEO_MAX_SIZE = int(os.getenv('PROPERTY_VIDEO_MAX_SIZE', 1024 * 1024 * 1024))
+# Unfinished uploads idle this long are removed by `manage.py expire_video_uploads`
+PROPERTY_UPLOAD_EXPIRY_HOURS = int(os.getenv('PROPERTY_UPLOAD_EXPIRY_HOURS', 24))
+
+# Rendered map tiles (z/x/y.mvt); must be shared when several hosts serve tiles
+PROPERTY_TILE_CACHE_DIR = os.getenv('PROPERTY_TILE_CACHE_DIR', str(BASE_DIR / 'tile_cache'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -28,6 +28,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # backs keyset pagination of a conversation's messages
+            models.Index(fields=['conversation', '-created_at', '-id'], name='msg_conv_created_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} in {self.conversation.id}"
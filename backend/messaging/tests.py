@@ -2,7 +2,7 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from messaging.models import Conversation, Message, MessageNotification
 from messaging.serializers import CreateMessageSerializer
-from rest_framework.test import APIRequestFactory
+from rest_framework.test import APIClient, APIRequestFactory
 
 
 class MessagingTests(TestCase):
@@ -25,3 +25,15 @@ class MessagingTests(TestCase):
 		self.assertEqual(Message.objects.filter(conversation=self.conv).count(), 1)
 		# Notification created for other participant (bob)
 		self.assertTrue(MessageNotification.objects.filter(user=self.u2, message=msg).exists())
+
+	def test_message_history_pages_are_chronological(self):
+		for i in range(5):
+			Message.objects.create(conversation=self.conv, sender=self.u1, content=f'm{i}')
+		client = APIClient()
+		client.force_authenticate(self.u2)
+
+		page = client.get(f'/api/messaging/conversations/{self.conv.pk}/messages/', {'page_size': 3}).json()
+		self.assertEqual([m['content'] for m in page['results']], ['m2', 'm3', 'm4'])
+		older = client.get(page['next']).json()
+		self.assertEqual([m['content'] for m in older['results']], ['m0', 'm1'])
+		self.assertIsNone(older['next'])
@@ -5,6 +5,18 @@ from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
 from .models import Conversation, Message, MessageNotification
 from .serializers import ConversationSerializer, MessageSerializer, CreateMessageSerializer
+from utils.pagination import KeysetPagination
+
+
+class MessageHistoryPagination(KeysetPagination):
+    """Keyset pages of a conversation, newest page first but each page in
+    chronological order, the way a chat renders it. ``next`` links to older messages.
+    """
+    page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return list(reversed(super().paginate_queryset(queryset, request, view)))
+
 
 class ConversationViewSet(viewsets.ModelViewSet):
     serializer_class = ConversationSerializer
@@ -22,8 +34,10 @@ class ConversationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
         conversation = self.get_object()
-        messages = conversation.messages.all()
-        serializer = MessageSerializer(messages, many=True)
+        # latest page first, each page oldest-to-newest; ``next`` walks back through history
+        paginator = MessageHistoryPagination()
+        page = paginator.paginate_queryset(conversation.messages.select_related('sender'), request, view=self)
+        serializer = MessageSerializer(page, many=True)
         
         # Mark messages as read for the current user
         conversation.messages.filter(
@@ -31,7 +45,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
             is_read=False
         ).update(is_read=True)
         
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
@@ -101,6 +115,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
 class MessageViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         user = self.request.user
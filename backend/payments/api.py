@@ -4,6 +4,7 @@ from .models import Payment
 from django.db.models import Q
 from rest_framework.decorators import action
 from .serializers import PaymentSerializer, SubscriptionPaymentSerializer
+from utils.pagination import KeysetPagination
 import json
 from django.http import HttpResponse
 from django.template.loader import render_to_string
@@ -17,6 +18,7 @@ User = get_user_model()
 class PaymentViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """Filter payments based on user role."""
@@ -35,7 +37,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
     def list(self, request):
         """Return paginated list of payments with related data."""
-        payments = self.get_queryset()
+        payments = self.paginate_queryset(self.get_queryset().select_related('user', 'property'))
         data = [{
             'id': payment.id,
             'user': {
@@ -53,7 +55,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
             'transaction_id': payment.transaction_id,
             'created_at': payment.created_at.isoformat(),
         } for payment in payments]
-        return Response(data)
+        return self.get_paginated_response(data)
 
     @action(detail=False, methods=['get'])
     def subscription(self, request):
@@ -32,5 +32,12 @@ class Payment(models.Model):
 	raw_payload = models.JSONField(blank=True, null=True)
 	created_at = models.DateTimeField(auto_now_add=True)
 
+	class Meta:
+		indexes = [
+			# back keyset pagination of payment history
+			models.Index(fields=['-created_at', '-id'], name='pay_created_id_idx'),
+			models.Index(fields=['user', '-created_at', '-id'], name='pay_user_created_idx'),
+		]
+
 	def __str__(self):
 		return f"{self.method} {self.amount} {self.status}"
\ No newline at end of file
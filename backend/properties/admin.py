@@ -33,7 +33,8 @@ class PropertyVisitAdmin(admin.ModelAdmin):
     search_fields = ('property__title', 'visitor__username')
 '''
 from django.contrib import admin
-from .models import AgentProfile, Property, MediaProperty
+from django.utils import timezone
+from .models import AgentProfile, Property, MediaProperty, DuplicateCandidate
 
 @admin.register(AgentProfile)
 class AgentProfileAdmin(admin.ModelAdmin):
@@ -76,3 +77,31 @@ class PropertyInline(admin.ModelAdmin):
     search_fields = ('title', 'description', 'city', 'location')
     inlines = [MediaPropertyTabularInline]
 
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ('property', 'original', 'similarity', 'distance_m', 'price_gap', 'status', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('property__title', 'original__title', 'property__owner__username')
+    list_select_related = ('property', 'original')
+    readonly_fields = ('property', 'original', 'similarity', 'distance_m', 'price_gap', 'reviewed_by', 'reviewed_at', 'created_at')
+
+    actions = ['confirm_and_unpublish', 'dismiss']
+
+    def confirm_and_unpublish(self, request, queryset):
+        count = 0
+        for candidate in queryset.select_related('property'):
+            prop = candidate.property
+            if prop.is_published:
+                prop.is_published = False
+                # save() so search, caches and stats follow the listing going offline
+                prop.save()
+            count += 1
+        queryset.update(status='confirmed', reviewed_by=request.user, reviewed_at=timezone.now())
+        self.message_user(request, f"{count} duplicates confirmed and unpublished.")
+    confirm_and_unpublish.short_description = "Confirm duplicate and unpublish the repost"
+
+    def dismiss(self, request, queryset):
+        count = queryset.update(status='dismissed', reviewed_by=request.user, reviewed_at=timezone.now())
+        self.message_user(request, f"{count} candidates dismissed.")
+    dismiss.short_description = "Not a duplicate"
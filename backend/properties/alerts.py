@@ -0,0 +1,112 @@
+"""New-listing alerts for saved searches.
+
+When listings are published, notify_published() looks up candidate searches for
+each one through the (is_active, city_key, type) index: only searches for that
+city or any city, and that type or any type, are read, with the price, bedroom
+and bounding-box predicates checked in the same query. The radius is then
+checked exactly in Python. Matches are written with one bulk_create and pushed
+to each user's ``notifications_{id}`` channel group as one message per batch.
+"""
+import logging
+import math
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db.models import Q
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications.serializers import NotificationSerializer
+
+from .models import Property, SavedSearch
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_TYPE = 'saved_search_match'
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance (haversine)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def candidate_searches(prop):
+    """Active searches whose indexed predicates admit prop (radius still to be checked)."""
+    lat, lng = (prop.location.y, prop.location.x) if prop.location else (None, None)
+    near = Q(radius_km__isnull=True)
+    if lat is not None:
+        near |= Q(min_lat__lte=lat, max_lat__gte=lat, min_lng__lte=lng, max_lng__gte=lng)
+    return (
+        SavedSearch.objects.filter(is_active=True, city_key__in=['', prop.city.strip().lower()], type__in=['', prop.type])
+        .filter(Q(min_price__isnull=True) | Q(min_price__lte=prop.price))
+        .filter(Q(max_price__isnull=True) | Q(max_price__gte=prop.price))
+        .filter(Q(min_bedrooms__isnull=True) | Q(min_bedrooms__lte=prop.bedrooms))
+        .filter(near)
+        .exclude(user_id=prop.owner_id)
+    )
+
+
+def within_radius(search, prop):
+    if search.radius_km is None:
+        return True
+    return distance_km(search.latitude, search.longitude, prop.location.y, prop.location.x) <= search.radius_km
+
+
+def matching_searches(prop):
+    return [search for search in candidate_searches(prop) if within_radius(search, prop)]
+
+
+def build_notification(search, prop):
+    return Notification(
+        user_id=search.user_id,
+        type=NOTIFICATION_TYPE,
+        title=f'New listing for "{search.name}"',
+        message=f'{prop.title} in {prop.city} for {prop.price}',
+        data={'property_id': prop.pk, 'saved_search_id': search.pk},
+    )
+
+
+def notify_published(property_ids):
+    """Notify owners of saved searches matching newly published listings; returns the count."""
+    listings = Property.objects.filter(pk__in=property_ids, is_published=True)
+    notifications, matched_searches, seen = [], set(), set()
+    for prop in listings:
+        for search in matching_searches(prop):
+            # one alert per user and listing, however many of their searches match
+            if (search.user_id, prop.pk) in seen:
+                continue
+            seen.add((search.user_id, prop.pk))
+            matched_searches.add(search.pk)
+            notifications.append(build_notification(search, prop))
+    if not notifications:
+        return 0
+
+    Notification.objects.bulk_create(notifications)
+    SavedSearch.objects.filter(pk__in=matched_searches).update(last_notified_at=timezone.now())
+    push(notifications)
+    return len(notifications)
+
+
+def push(notifications):
+    """Send each user's batch to their notifications_{id} group in one message."""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    by_user = defaultdict(list)
+    for notification in notifications:
+        by_user[notification.user_id].append(NotificationSerializer(notification).data)
+    for user_id, batch in by_user.items():
+        try:
+            async_to_sync(layer.group_send)(f'notifications_{user_id}', {
+                'type': 'notification.message',
+                'message': {'type': NOTIFICATION_TYPE, 'notifications': batch},
+            })
+        except Exception:
+            # the rows are stored either way; the websocket push is best effort
+            logger.exception('Could not push saved-search alerts to user %s', user_id)
@@ -5,3 +5,7 @@ class PropertiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'properties'
     verbose_name = 'Properties'
+
+    def ready(self):
+        # Register signal handlers keeping the search index (and other derived data) in sync
+        import properties.signals  # noqa: F401
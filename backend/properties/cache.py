@@ -0,0 +1,110 @@
+"""Versioned response cache for the property endpoints.
+
+Every cached payload key embeds a version number: one per property for detail
+pages and one shared by all list-like responses (list pages, facets). Changing
+a property, its media or its features bumps the relevant versions, which makes
+the old keys unreachable; they simply age out of the cache instead of being
+deleted or flushed.
+
+Versions are nanosecond timestamps rather than counters, so a version key that
+gets evicted can never come back with a value an old payload was stored under.
+Invalidation only reaches other processes if CACHES points at a shared backend.
+"""
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.utils import timezone
+
+LIST_VERSION_KEY = 'property-list:version'
+
+
+def _property_version_key(pk):
+    return f'property:{pk}:version'
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def list_version():
+    return _get_version(LIST_VERSION_KEY)
+
+
+def property_version(pk):
+    return _get_version(_property_version_key(pk))
+
+
+def invalidate_lists():
+    cache.set(LIST_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_property(pk):
+    """Retire cached payloads for one property and every list it may appear in."""
+    if pk is not None:
+        cache.set(_property_version_key(pk), time.time_ns(), None)
+    invalidate_lists()
+
+
+def invalidate_properties(pks):
+    """invalidate_property() for many properties at once."""
+    version = time.time_ns()
+    cache.set_many({_property_version_key(pk): version for pk in pks}, None)
+    invalidate_lists()
+
+
+_batch = threading.local()
+
+
+@contextmanager
+def batched_listing_changes():
+    """Collapse the mark_listing_changed() calls made in the block into one per
+    listing, issued when the block exits (e.g. for the per-row post_delete
+    signals of a queryset delete).
+    """
+    if getattr(_batch, 'pks', None) is not None:
+        yield
+        return
+    _batch.pks = set()
+    try:
+        yield
+        pks = _batch.pks
+    finally:
+        _batch.pks = None
+    for pk in pks:
+        mark_listing_changed(pk)
+
+
+def mark_listing_changed(pk):
+    """Record a change to a listing's media or features.
+
+    Bumps Property.updated_at (which feeds the ETag / Last-Modified validators)
+    with a plain UPDATE and retires the cached payloads of the listing.
+    """
+    from .models import Property
+
+    if getattr(_batch, 'pks', None) is not None:
+        _batch.pks.add(pk)
+        return
+
+    Property.objects.filter(pk=pk).update(updated_at=timezone.now())
+    invalidate_property(pk)
+
+
+def _request_digest(request):
+    # serialized output embeds absolute media and pagination URLs, so the host matters
+    return hashlib.sha1(request.build_absolute_uri().encode('utf-8')).hexdigest()
+
+
+def detail_cache_key(request, pk):
+    return f'property-detail:{pk}:{property_version(pk)}:{_request_digest(request)}'
+
+
+def list_cache_key(request):
+    return f'property-list:{list_version()}:{_request_digest(request)}'
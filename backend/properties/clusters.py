@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.db.models import Avg, Count, FloatField, Func, Max, Min, Q
+from django.db.models.functions import Substr
+
+from . import geohash
+from .cache import list_version
+from .filters import ATTRIBUTE_PARAMS, filter_key
+
+# Geohash length used for clusters at each zoom level (index = zoom, capped at the last entry)
+ZOOM_PRECISION = (1, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 6, 7, 7, 8)
+
+# Tiles are the geohash cells TILE_DEPTH characters shorter than the clusters they hold
+TILE_DEPTH = 2
+MAX_TILES = 64
+
+
+def precision_for_zoom(zoom):
+    return ZOOM_PRECISION[min(zoom, len(ZOOM_PRECISION) - 1)]
+
+
+def tiles_for(bbox, precision):
+    tile_precision = max(1, precision - TILE_DEPTH)
+    tiles = geohash.cover(bbox, tile_precision)
+    while len(tiles) > MAX_TILES and tile_precision > 1:
+        tile_precision -= 1
+        tiles = geohash.cover(bbox, tile_precision)
+    return tiles
+
+
+def _coordinate(function):
+    return Avg(Func('location', function=function, output_field=FloatField()))
+
+
+def aggregate_tiles(queryset, tiles, precision):
+    """Group the properties inside tiles into geohash cells of length precision.
+
+    One GROUP BY over the tiles' geohash ranges; returns {tile: clusters}, with an
+    empty list for tiles that hold no properties.
+    """
+    within = Q()
+    for tile in tiles:
+        low, high = geohash.prefix_range(tile)
+        within |= Q(geohash__gte=low, geohash__lt=high)
+    rows = (
+        queryset.filter(within)
+        .order_by()
+        .annotate(cell=Substr('geohash', 1, precision))
+        .values('cell')
+        .annotate(
+            count=Count('id'), lng=_coordinate('ST_X'), lat=_coordinate('ST_Y'),
+            min_price=Min('price'), max_price=Max('price'),
+        )
+    )
+    clusters = {tile: [] for tile in tiles}
+    # every tile of one cover has the same length, and is a prefix of its cells
+    length = len(tiles[0])
+    for row in rows:
+        clusters[row['cell'][:length]].append({
+            'geohash': row['cell'],
+            'count': row['count'],
+            'center': {'lat': row['lat'], 'lng': row['lng']},
+            'price': {'min': row['min_price'], 'max': row['max_price']},
+        })
+    return clusters
+
+
+def get_clusters(queryset, params, bbox, zoom):
+    """Return the clusters whose centroid lies in bbox, computed and cached per tile."""
+    precision = precision_for_zoom(zoom)
+    # the viewport is not part of the key: tiles are shared by every bbox that overlaps them
+    prefix = filter_key(params, f'property-clusters:{list_version()}:{precision}', ATTRIBUTE_PARAMS)
+    keys = {tile: f'{prefix}:{tile}' for tile in tiles_for(bbox, precision)}
+    cached = cache.get_many(keys.values())
+    missing = [tile for tile, key in keys.items() if key not in cached]
+    if missing:
+        # all uncached tiles of the viewport in a single query
+        fresh = {keys[tile]: tile_clusters for tile, tile_clusters in aggregate_tiles(queryset, missing, precision).items()}
+        cache.set_many(fresh)
+        cached.update(fresh)
+    clusters = [cluster for key in keys.values() for cluster in cached[key]]
+
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return {
+        'zoom': zoom,
+        'precision': precision,
+        'clusters': [
+            c for c in clusters
+            if min_lat <= c['center']['lat'] <= max_lat and min_lng <= c['center']['lng'] <= max_lng
+        ],
+    }
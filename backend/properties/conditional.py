@@ -0,0 +1,67 @@
+"""ETag / Last-Modified validators for the property endpoints.
+
+Validators come from ``updated_at``. The views store the inputs next to the
+cached payload (under the list or property version), so a cache hit answers a
+matching If-None-Match / If-Modified-Since request with an empty 304 without
+touching the database; only a miss runs the single query below.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, *parts):
+    # the payload embeds absolute URLs and depends on the query string; the body
+    # also differs per negotiated renderer (JSON vs the browsable API)
+    renderer = getattr(request, 'accepted_renderer', None)
+    seed = '|'.join([request.build_absolute_uri(), getattr(renderer, 'format', '')] + [str(part) for part in parts])
+    return quote_etag(hashlib.sha1(seed.encode('utf-8')).hexdigest())
+
+
+def list_stats(queryset):
+    """(count, last modified) of a filtered property list."""
+    stats = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    return stats['count'], stats['last_modified']
+
+
+def list_validators(request, stats):
+    """Return (etag, last_modified) for a list with the given list_stats()."""
+    count, last_modified = stats
+    return make_etag(request, count, last_modified), last_modified
+
+
+def detail_updated_at(queryset, pk):
+    return queryset.filter(pk=pk).values_list('updated_at', flat=True).first()
+
+
+def detail_validators(request, pk, updated_at):
+    """Return (etag, last_modified) for one property, or (None, None) if it does not exist."""
+    if updated_at is None:
+        return None, None
+    return make_etag(request, pk, updated_at), updated_at
+
+
+def not_modified(request, etag, last_modified):
+    """Return a 304 response when the client's cached copy is still current, else None."""
+    if etag is None:
+        return None
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        fresh = if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+    else:
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        fresh = since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+    if not fresh:
+        return None
+    return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
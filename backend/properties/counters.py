@@ -0,0 +1,88 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Write-behind buffer for Property.view_count.
+
+    Views are counted in memory and written out at most once per ``interval``
+    seconds as ``UPDATE ... SET view_count = view_count + n``, one statement per
+    distinct increment. A hot listing therefore costs one write per flush rather
+    than a row write (and lock) per page view. The update bypasses save(), so it
+    neither touches updated_at nor invalidates cached responses.
+
+    The buffer lives in the worker process. A daemon thread, started with the
+    first view in each process, flushes it every ``interval`` seconds even when
+    no further views arrive, and atexit flushes what is left on a clean shutdown;
+    a killed worker loses at most one interval of views.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flusher_pid = None
+
+    def record(self, pk):
+        with self._lock:
+            self._pending[int(pk)] += 1
+            due = time.monotonic() - self._last_flush >= self.interval
+            if self._flusher_pid != os.getpid():
+                # per process: a thread started before a fork does not survive into the child
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_periodically, name='view-counter', daemon=True).start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered increments; returns the number of properties updated."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        from .models import Property
+
+        by_increment = defaultdict(list)
+        for pk, count in pending.items():
+            by_increment[count].append(pk)
+        written = 0
+        for count, ids in list(by_increment.items()):
+            try:
+                Property.objects.filter(pk__in=ids).update(view_count=F('view_count') + count)
+            except Exception:
+                logger.exception('Failed to flush property view counts; keeping them for the next flush')
+                # each UPDATE autocommits, so only the groups not yet written go back
+                with self._lock:
+                    for increment, unwritten in by_increment.items():
+                        self._pending.update(dict.fromkeys(unwritten, increment))
+                return written
+            written += len(ids)
+            del by_increment[count]
+        return written
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.interval)
+            if time.monotonic() - self._last_flush >= self.interval:
+                self.flush()
+                # the thread's own connection would otherwise stay open between flushes
+                connection.close()
+
+
+view_counter = ViewCounter(getattr(settings, 'PROPERTY_VIEW_FLUSH_INTERVAL', 30))
+
+# don't lose the tail of the buffer when the worker process shuts down
+atexit.register(view_counter.flush)
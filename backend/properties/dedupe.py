@@ -0,0 +1,146 @@
+"""Near-duplicate listing detection (``manage.py find_duplicate_properties``).
+
+Each listing's title and description are cut into character shingles and
+summarized by a MinHash signature of NUM_PERMUTATIONS values. Signatures are
+split into BANDS bands; listings sharing any band land in the same LSH bucket
+and become candidate pairs, so only near-identical texts are ever compared
+instead of all n² pairs. With 16 bands of 8 rows, pairs above ~0.7 estimated
+Jaccard similarity are found with high probability.
+
+Candidates are kept when the text similarity, type, location (within
+MAX_DISTANCE_M) and price (within PRICE_TOLERANCE) all agree, and are written
+to DuplicateCandidate for admins to confirm or dismiss. Listings without a
+real location (none, or the DEFAULT_LOCATION placeholder) are not compared:
+they would all look co-located.
+"""
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.db.models import FloatField, Func
+
+from .alerts import distance_km
+from .models import DEFAULT_POINT, DuplicateCandidate, Property
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+# Largest prime below 2**32, so hash values fit in uint32
+PRIME = 4294967291
+
+TEXT_THRESHOLD = 0.7
+MAX_DISTANCE_M = 250.0
+PRICE_TOLERANCE = 0.1
+
+CHUNK_SIZE = 2000
+
+# Buckets this large are shared boilerplate rather than copies of one listing
+MAX_BUCKET_SIZE = 50
+
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 2 ** 31, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 31, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize(text):
+    return re.sub(r'[^\w]+', ' ', (text or '').lower()).strip()
+
+
+def shingles(text):
+    """crc32 hashes of the distinct character shingles of text."""
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        grams = {text} if text else set()
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def signature(hashes):
+    """MinHash signature: per permutation, the minimum of (a*x + b) mod PRIME."""
+    if not len(hashes):
+        return np.full(NUM_PERMUTATIONS, PRIME, dtype=np.uint32)
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def candidate_pairs(signatures):
+    """Pairs of row indexes that share at least one LSH band."""
+    pairs = set()
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        block = np.ascontiguousarray(signatures[:, band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        for row, key in enumerate(block):
+            buckets[key.tobytes()].append(row)
+        for rows in buckets.values():
+            if 1 < len(rows) <= MAX_BUCKET_SIZE:
+                pairs.update((a, b) for i, a in enumerate(rows) for b in rows[i + 1:])
+    return pairs
+
+
+def load_listings(queryset, chunk_size=CHUNK_SIZE):
+    """(id, type, price, lat, lng) rows and MinHash signatures of the placed listings.
+
+    Rows are streamed and only the signature of each text is kept, so memory
+    grows with the number of listings rather than the length of their descriptions.
+    """
+    rows = (
+        queryset.annotate(
+            lng=Func('location', function='ST_X', output_field=FloatField()),
+            lat=Func('location', function='ST_Y', output_field=FloatField()),
+        )
+        .order_by('id')
+        .values_list('id', 'title', 'description', 'type', 'price', 'lat', 'lng')
+        .iterator(chunk_size=chunk_size)
+    )
+    listings, signatures = [], []
+    for pk, title, description, type, price, lat, lng in rows:
+        if lat is None or lng is None or (lng, lat) == DEFAULT_POINT:
+            continue
+        listings.append((pk, type, price, lat, lng))
+        signatures.append(signature(shingles(f'{title} {description}')))
+    return listings, signatures
+
+
+def find_duplicates(queryset=None, threshold=TEXT_THRESHOLD, max_distance_m=MAX_DISTANCE_M,
+                    price_tolerance=PRICE_TOLERANCE):
+    """Yield (older_id, newer_id, similarity, distance_m, price_gap) for likely duplicates."""
+    listings, signatures = load_listings(queryset if queryset is not None else Property.objects.all())
+    if len(listings) < 2:
+        return
+    signatures = np.vstack(signatures)
+
+    for a, b in sorted(candidate_pairs(signatures)):
+        similarity = float(np.mean(signatures[a] == signatures[b]))
+        if similarity < threshold:
+            continue
+        id_a, type_a, price_a, lat_a, lng_a = listings[a]
+        id_b, type_b, price_b, lat_b, lng_b = listings[b]
+        if type_a != type_b:
+            continue
+        distance_m = distance_km(lat_a, lng_a, lat_b, lng_b) * 1000
+        if distance_m > max_distance_m:
+            continue
+        high = max(price_a, price_b)
+        price_gap = float(abs(price_a - price_b) / high) if high else 0.0
+        if price_gap > price_tolerance:
+            continue
+        # listings are ordered by id, so a is the original and b the repost
+        yield id_a, id_b, similarity, distance_m, price_gap
+
+
+def record_duplicates(matches):
+    """Store new findings; pairs already reviewed keep their status. Returns rows inserted."""
+    candidates = [
+        DuplicateCandidate(
+            original_id=original, property_id=duplicate, similarity=round(similarity, 3),
+            distance_m=round(distance_m, 1), price_gap=round(price_gap, 4),
+        )
+        for original, duplicate, similarity, distance_m, price_gap in matches
+    ]
+    before = DuplicateCandidate.objects.count()
+    DuplicateCandidate.objects.bulk_create(candidates, batch_size=1000, ignore_conflicts=True)
+    return DuplicateCandidate.objects.count() - before
@@ -0,0 +1,48 @@
+"""Streaming GeoJSON export of published listings (/api/properties/export.geojson).
+
+Rows are read with .iterator() as plain tuples and written out as they arrive,
+so memory stays flat however many listings are exported. Listings still at the
+DEFAULT_LOCATION placeholder are exported with a null geometry.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import FloatField, Func
+
+from .models import DEFAULT_POINT
+
+CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = (
+    'title', 'type', 'status', 'price', 'area', 'rooms', 'bedrooms', 'bathrooms',
+    'city', 'adress', 'created_at', 'updated_at',
+)
+
+
+def feature(pk, lng, lat, values):
+    properties = dict(zip(EXPORT_FIELDS, values), id=pk)
+    placed = lng is not None and (lng, lat) != DEFAULT_POINT
+    geometry = {'type': 'Point', 'coordinates': [lng, lat]} if placed else None
+    return {'type': 'Feature', 'id': pk, 'geometry': geometry, 'properties': properties}
+
+
+def geojson_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Yield a FeatureCollection as text, one piece per chunk_size listings."""
+    rows = (
+        queryset.annotate(
+            lng=Func('location', function='ST_X', output_field=FloatField()),
+            lat=Func('location', function='ST_Y', output_field=FloatField()),
+        )
+        .order_by('id')
+        .values_list('id', 'lng', 'lat', *EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    yield '{"type":"FeatureCollection","features":['
+    batch, separator = [], ''
+    for pk, lng, lat, *values in rows:
+        batch.append(encoder.encode(feature(pk, lng, lat, values)))
+        if len(batch) == chunk_size:
+            yield separator + ','.join(batch)
+            batch, separator = [], ','
+    if batch:
+        yield separator + ','.join(batch)
+    yield ']}'
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Value, When
+
+from .cache import list_version
+from .filters import FILTER_PARAMS, filter_key
+
+# Upper bounds (exclusive) of the price buckets, in TZS; the last bucket is open-ended
+DEFAULT_PRICE_BUCKETS = (50_000_000, 100_000_000, 250_000_000, 500_000_000, 1_000_000_000)
+
+# Bedroom counts get their own bucket up to this value, everything above is "N+"
+MAX_BEDROOM_BUCKET = 5
+
+FACETS_TIMEOUT = getattr(settings, 'PROPERTY_FACETS_TIMEOUT', 60 * 5)
+
+
+def price_buckets():
+    return tuple(getattr(settings, 'PROPERTY_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+
+
+def price_labels():
+    bounds = (0,) + price_buckets()
+    return [f'{lower}-{upper}' for lower, upper in zip(bounds, bounds[1:])] + [f'{bounds[-1]}+']
+
+
+def bedroom_labels():
+    return [str(n) for n in range(MAX_BEDROOM_BUCKET)] + [f'{MAX_BEDROOM_BUCKET}+']
+
+
+def price_bucket_expression():
+    labels = price_labels()
+    whens = [When(price__lt=upper, then=Value(label)) for upper, label in zip(price_buckets(), labels)]
+    return Case(*whens, default=Value(labels[-1]), output_field=CharField())
+
+
+def bedroom_bucket_expression():
+    labels = bedroom_labels()
+    whens = [When(bedrooms=n, then=Value(labels[n])) for n in range(MAX_BEDROOM_BUCKET)]
+    return Case(*whens, default=Value(labels[-1]), output_field=CharField())
+
+
+def by_count(counts):
+    return sorted(
+        ({'value': value, 'count': count} for value, count in counts.items()),
+        key=lambda item: (-item['count'], item['value']),
+    )
+
+
+def in_order(labels, counts):
+    return [{'value': label, 'count': counts.get(label, 0)} for label in labels]
+
+
+def compute_facets(queryset):
+    """Count the filtered properties per type, city, status, bedroom and price bucket.
+
+    Everything comes from a single GROUP BY over the combination of the five
+    facet values; the per-facet totals are rolled up from those rows in Python.
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(bedroom_bucket=bedroom_bucket_expression(), price_bucket=price_bucket_expression())
+        .values('type', 'city', 'status', 'bedroom_bucket', 'price_bucket')
+        .annotate(n=Count('id'))
+    )
+    facets = {name: {} for name in ('type', 'city', 'status', 'bedrooms', 'price')}
+    total = 0
+    for row in rows:
+        total += row['n']
+        for facet, column in (('type', 'type'), ('city', 'city'), ('status', 'status'),
+                              ('bedrooms', 'bedroom_bucket'), ('price', 'price_bucket')):
+            facets[facet][row[column]] = facets[facet].get(row[column], 0) + row['n']
+
+    return {
+        'total': total,
+        'type': by_count(facets['type']),
+        'city': by_count(facets['city']),
+        'status': by_count(facets['status']),
+        'bedrooms': in_order(bedroom_labels(), facets['bedrooms']),
+        'price': in_order(price_labels(), facets['price']),
+    }
+
+
+def get_facets(queryset, params):
+    """Return compute_facets for params, cached per normalized filter set.
+
+    The key carries the shared list version, so any property change retires it.
+    """
+    key = filter_key(params, f'property-facets:{list_version()}', FILTER_PARAMS + ('q',))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
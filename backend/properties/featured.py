@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache import list_version
+
+# Size of the homepage carousel
+MAX_FEATURED = 20
+
+# Upper bound on how long a ranking is served; it is usually retired sooner, when
+# a listing is saved (list version) or the first feature window runs out.
+FEATURED_TIMEOUT = getattr(settings, 'PROPERTY_FEATURED_TIMEOUT', 60 * 15)
+
+# paid placements first, then the most viewed, then the newest
+FEATURED_RANKING = ('-is_paid', '-view_count', '-created_at', '-id')
+
+
+def featured_queryset(queryset, now=None):
+    """Published listings whose feature window is still open (uses prop_featured_idx)."""
+    now = now or timezone.now()
+    return queryset.filter(is_published=True, featured_until__gt=now)
+
+
+def rank_featured(queryset, serializer_class, now=None):
+    """Serialize the ranked carousel and return it with the seconds it stays valid."""
+    now = now or timezone.now()
+    listings = list(featured_queryset(queryset, now).order_by(*FEATURED_RANKING)[:MAX_FEATURED])
+    timeout = FEATURED_TIMEOUT
+    if listings:
+        first_expiry = min(listing.featured_until for listing in listings)
+        timeout = max(1, min(timeout, int((first_expiry - now).total_seconds()) + 1))
+    return serializer_class(listings, many=True).data, timeout
+
+
+def get_featured(queryset, serializer_class):
+    """Return the cached carousel, rebuilding it after a listing change or window expiry.
+
+    Listings becoming featured are saved, which bumps the list version; listings
+    dropping out are handled by expiring the entry at the earliest featured_until.
+    """
+    key = f'property-featured:{list_version()}'
+    data = cache.get(key)
+    if data is None:
+        data, timeout = rank_featured(queryset, serializer_class)
+        cache.set(key, data, timeout)
+    return data
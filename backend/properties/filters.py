@@ -0,0 +1,159 @@
+import hashlib
+import math
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+# SRID used by Property.location
+SRID = 4326
+
+# Approximate length of one degree of latitude in kilometres
+KM_PER_DEGREE = 111.32
+
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 200.0
+
+# Query parameters that narrow the property set (pagination and ordering excluded)
+ATTRIBUTE_PARAMS = (
+    'type', 'city', 'status', 'is_published', 'min_price', 'max_price',
+    'bedrooms', 'min_bedrooms',
+)
+FILTER_PARAMS = ATTRIBUTE_PARAMS + ('near', 'radius_km', 'bbox')
+
+
+def parse_point(value):
+    """Parse a 'lat,lng' query value into a Point (x=lng, y=lat)."""
+    try:
+        lat, lng = [float(part) for part in value.split(',')]
+    except (AttributeError, ValueError):
+        raise ValidationError({'near': "Expected 'lat,lng'."})
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValidationError({'near': 'Coordinates out of range.'})
+    return Point(lng, lat, srid=SRID)
+
+
+def parse_radius(value):
+    """Parse radius_km, falling back to the default and capping it."""
+    if value in (None, ''):
+        return DEFAULT_RADIUS_KM
+    try:
+        radius = float(value)
+    except ValueError:
+        raise ValidationError({'radius_km': 'Expected a number.'})
+    if radius <= 0:
+        raise ValidationError({'radius_km': 'Must be greater than zero.'})
+    return min(radius, MAX_RADIUS_KM)
+
+
+def parse_bbox(value, param='bbox'):
+    """Parse a 'min_lng,min_lat,max_lng,max_lat' query value."""
+    try:
+        min_lng, min_lat, max_lng, max_lat = [float(part) for part in value.split(',')]
+    except (AttributeError, ValueError):
+        raise ValidationError({param: "Expected 'min_lng,min_lat,max_lng,max_lat'."})
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ValidationError({param: 'Minimum values must not exceed maximum values.'})
+    return (max(min_lng, -180.0), max(min_lat, -90.0), min(max_lng, 180.0), min(max_lat, 90.0))
+
+
+def radius_bbox(point, radius_km):
+    """Return the bounding box that fully encloses a circle around point."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(point.y))
+    dlng = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (
+        max(point.x - dlng, -180.0), max(point.y - dlat, -90.0),
+        min(point.x + dlng, 180.0), min(point.y + dlat, 90.0),
+    )
+
+
+def in_spatial_index(queryset, bbox):
+    """Restrict queryset to rows whose location lies in bbox using the SpatiaLite R*Tree.
+
+    SpatiaLite never consults the spatial index implicitly, so the candidate rowids
+    are pulled from the SpatialIndex virtual table. Property ids are the table rowids.
+    """
+    table = queryset.model._meta.db_table
+    sql = (
+        'SELECT ROWID FROM SpatialIndex WHERE f_table_name = %s AND f_geometry_column = %s '
+        'AND search_frame = BuildMbr(%s, %s, %s, %s, %s)'
+    )
+    return queryset.filter(pk__in=RawSQL(sql, (table, 'location', *bbox, SRID)))
+
+
+def apply_geo_filters(queryset, params):
+    """Apply the ?near=&radius_km=, ?bbox= and ?ordering=distance query modes.
+
+    Returns the filtered queryset and a flag telling whether it is ordered by distance.
+    """
+    near = params.get('near')
+    bbox = params.get('bbox')
+    by_distance = params.get('ordering') == 'distance'
+
+    if by_distance and not near:
+        raise ValidationError({'ordering': "Distance ordering requires 'near'."})
+
+    if bbox:
+        queryset = in_spatial_index(queryset, parse_bbox(bbox))
+
+    if near:
+        point = parse_point(near)
+        radius = parse_radius(params.get('radius_km'))
+        queryset = in_spatial_index(queryset, radius_bbox(point, radius))
+        queryset = queryset.filter(location__distance_lte=(point, D(km=radius)))
+        if by_distance:
+            queryset = queryset.annotate(distance=Distance('location', point)).order_by('distance', 'id')
+
+    return queryset, by_distance
+
+
+def parse_decimal(value, param):
+    try:
+        number = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValidationError({param: 'Expected a number.'})
+    if not number.is_finite():
+        raise ValidationError({param: 'Expected a number.'})
+    return number
+
+
+def parse_int(value, param):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({param: 'Expected an integer.'})
+
+
+def apply_attribute_filters(queryset, params):
+    """Apply the exact and range filters on Property columns."""
+    for param in ('type', 'city', 'status'):
+        if params.get(param):
+            queryset = queryset.filter(**{param: params[param]})
+    if params.get('is_published') not in (None, ''):
+        queryset = queryset.filter(is_published=params['is_published'].lower() in ('1', 'true', 'yes'))
+    if params.get('min_price'):
+        queryset = queryset.filter(price__gte=parse_decimal(params['min_price'], 'min_price'))
+    if params.get('max_price'):
+        queryset = queryset.filter(price__lte=parse_decimal(params['max_price'], 'max_price'))
+    if params.get('bedrooms'):
+        queryset = queryset.filter(bedrooms=parse_int(params['bedrooms'], 'bedrooms'))
+    if params.get('min_bedrooms'):
+        queryset = queryset.filter(bedrooms__gte=parse_int(params['min_bedrooms'], 'min_bedrooms'))
+    return queryset
+
+
+def filter_properties(queryset, params):
+    """Apply every supported list filter; see apply_geo_filters for the return value."""
+    return apply_geo_filters(apply_attribute_filters(queryset, params), params)
+
+
+def filter_key(params, prefix, names=FILTER_PARAMS):
+    """Return a cache key identifying the normalized filter set in params."""
+    normalized = sorted((name, params[name].strip()) for name in names if params.get(name, '').strip())
+    digest = hashlib.sha1(urlencode(normalized).encode('utf-8')).hexdigest()
+    return f'{prefix}:{digest}'
@@ -0,0 +1,232 @@
+"""Offline geocoding and coordinate backfill (``manage.py geocode_properties``).
+
+Place names from a local gazetteer file are loaded into a dict from normalized
+name to a row of a coordinate array, so a lookup never leaves the process.
+Listings are then read in primary-key batches and resolved with array
+operations. The first source that gives a position wins:
+
+1. a location moved off the DEFAULT_LOCATION placeholder,
+2. latitude/longitude,
+3. the gazetteer: a comma-separated part of ``adress`` (when it lies within
+   MAX_ADDRESS_KM of the city, or the city is unknown), otherwise ``city``.
+
+The rules match Property.sync_coordinates(). Only rows whose location,
+latitude or longitude disagree with the result are written, with bulk_update.
+"""
+import csv
+import functools
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.db.models import FloatField, Func
+from django.utils import timezone
+
+from . import geohash
+from .alerts import EARTH_RADIUS_KM
+from .models import DEFAULT_POINT, Property, coordinate
+from .signals import properties_relocated
+
+BATCH_SIZE = 2000
+
+# An address part farther than this from the listing's city is a namesake elsewhere
+MAX_ADDRESS_KM = 50.0
+
+# Columns of a GeoNames dump (tab-separated, no header)
+GEONAMES_NAME, GEONAMES_ASCII_NAME, GEONAMES_ALTERNATE_NAMES = 1, 2, 3
+GEONAMES_LAT, GEONAMES_LNG, GEONAMES_POPULATION = 4, 5, 14
+
+SOURCES = ('location', 'lat_lng', 'address', 'city')
+
+
+@functools.lru_cache(maxsize=100_000)
+def normalize(name):
+    """Lower-case, accent-free, punctuation-free form of a place name."""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return re.sub(r'[\W_]+', ' ', name.lower()).strip()
+
+
+def distance_km(a, b):
+    """Haversine distance between two arrays of (lng, lat) rows."""
+    lng1, lat1, lng2, lat2 = np.radians(a[:, 0]), np.radians(a[:, 1]), np.radians(b[:, 0]), np.radians(b[:, 1])
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+class Gazetteer:
+    """In-memory place-name index; where names collide the most populous place wins."""
+
+    def __init__(self):
+        self.index = {}
+        self._coords, self._population = [], []
+        self._array = None
+
+    @property
+    def coords(self):
+        """(lng, lat) per place plus a trailing NaN row, so row -1 reads as unknown."""
+        if self._array is None or len(self._array) != len(self._coords) + 1:
+            self._array = np.vstack((np.array(self._coords, dtype=float).reshape(-1, 2), [[np.nan, np.nan]]))
+        return self._array
+
+    @classmethod
+    def load(cls, path):
+        """Read a GeoNames dump (.txt, tab-separated) or a CSV with name, latitude,
+        longitude and optional alternate_names (|-separated) and population columns.
+        """
+        gazetteer = cls()
+        with open(path, newline='', encoding='utf-8') as handle:
+            geonames = '\t' in handle.readline()
+            handle.seek(0)
+            if geonames:
+                rows = csv.reader(handle, delimiter='\t', quoting=csv.QUOTE_NONE)
+            else:
+                rows = csv.DictReader(handle)
+            for line, row in enumerate(rows, start=1 if geonames else 2):
+                try:
+                    if geonames:
+                        names = [row[GEONAMES_NAME], row[GEONAMES_ASCII_NAME], *row[GEONAMES_ALTERNATE_NAMES].split(',')]
+                        lat, lng, population = row[GEONAMES_LAT], row[GEONAMES_LNG], row[GEONAMES_POPULATION]
+                    else:
+                        names = [row['name'], *(row.get('alternate_names') or '').split('|')]
+                        lat, lng, population = row['latitude'], row['longitude'], row.get('population')
+                    gazetteer.add(names, float(lat), float(lng), int(population or 0))
+                except (IndexError, KeyError, TypeError, ValueError) as exc:
+                    raise ValueError(f'{path}, line {line}: {exc!r}')
+        return gazetteer
+
+    def add(self, names, lat, lng, population=0):
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError('coordinates out of range')
+        row = len(self._coords)
+        self._coords.append((lng, lat))
+        self._population.append(population)
+        for name in filter(None, map(normalize, names)):
+            current = self.index.get(name)
+            if current is None or self._population[current] < population:
+                self.index[name] = row
+
+    def __len__(self):
+        return len(self._coords)
+
+    def lookup(self, names):
+        """Row of each name, -1 where the name is unknown."""
+        return np.fromiter((self.index.get(normalize(name), -1) for name in names), dtype=np.int64, count=len(names))
+
+    def lookup_address(self, addresses):
+        """Row of the first known comma-separated part of each address, -1 if none is known."""
+        def first(address):
+            for part in (address or '').split(','):
+                row = self.index.get(normalize(part))
+                if row is not None:
+                    return row
+            return -1
+        return np.fromiter((first(address) for address in addresses), dtype=np.int64, count=len(addresses))
+
+    def resolve(self, cities, addresses):
+        """(lng, lat) per listing (NaN where unknown) and whether the address supplied it."""
+        city, address = self.lookup(cities), self.lookup_address(addresses)
+        city_xy, address_xy = self.coords[city], self.coords[address]
+        with np.errstate(invalid='ignore'):
+            near_city = distance_km(address_xy, city_xy) <= MAX_ADDRESS_KM
+        use_address = (address >= 0) & ((city < 0) | near_city)
+        return np.where(use_address[:, None], address_xy, city_xy), use_address
+
+
+def load_batch(after, size=BATCH_SIZE):
+    rows = (
+        Property.objects.filter(pk__gt=after)
+        .annotate(
+            lng=Func('location', function='ST_X', output_field=FloatField()),
+            lat=Func('location', function='ST_Y', output_field=FloatField()),
+        )
+        .order_by('pk')
+        .values_list('id', 'lng', 'lat', 'longitude', 'latitude', 'city', 'adress')[:size]
+    )
+    return list(rows)
+
+
+def _floats(values):
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=float)
+
+
+def plan_batch(rows, gazetteer=None):
+    """Work out which rows need new coordinates.
+
+    Returns (updates, unresolved): updates are (id, lng, lat, previous (lng, lat)
+    or None, source) tuples, unresolved counts rows no source could place.
+    """
+    if not rows:
+        return [], 0
+    ids = [row[0] for row in rows]
+    point = np.column_stack((_floats(row[1] for row in rows), _floats(row[2] for row in rows)))
+    lat_lng = np.column_stack((_floats(row[3] for row in rows), _floats(row[4] for row in rows)))
+
+    has_point = np.isfinite(point).all(axis=1) & ~(point == DEFAULT_POINT).all(axis=1)
+    with np.errstate(invalid='ignore'):
+        has_lat_lng = (
+            np.isfinite(lat_lng).all(axis=1)
+            & (np.abs(lat_lng[:, 0]) <= 180) & (np.abs(lat_lng[:, 1]) <= 90)
+        )
+
+    target = np.where(has_point[:, None], point, np.where(has_lat_lng[:, None], lat_lng, np.nan))
+    source = np.where(has_point, 0, np.where(has_lat_lng, 1, -1))
+    rest = source < 0
+    if gazetteer is not None and rest.any():
+        cities = [row[5] for row, missing in zip(rows, rest) if missing]
+        addresses = [row[6] for row, missing in zip(rows, rest) if missing]
+        found, by_address = gazetteer.resolve(cities, addresses)
+        target[rest] = found
+        source[rest] = np.where(np.isfinite(found).all(axis=1), np.where(by_address, 2, 3), -1)
+
+    resolved = source >= 0
+    with np.errstate(invalid='ignore'):
+        # latitude/longitude keep 12 decimals, so compare at that precision
+        stale = ~(point == target).all(axis=1) | ~(np.abs(lat_lng - target) < 1e-9).all(axis=1)
+
+    updates = []
+    for i in np.flatnonzero(resolved & stale):
+        previous = tuple(map(float, point[i])) if np.isfinite(point[i]).all() else None
+        updates.append((ids[i], float(target[i, 0]), float(target[i, 1]), previous, SOURCES[source[i]]))
+    return updates, int((~resolved).sum())
+
+
+def write_updates(updates):
+    """Store planned coordinates with one bulk_update and notify properties_relocated."""
+    if not updates:
+        return
+    now = timezone.now()
+    listings = [
+        Property(
+            pk=pk, location=Point(lng, lat, srid=4326), latitude=coordinate(lat), longitude=coordinate(lng),
+            geohash=geohash.encode(lat, lng), updated_at=now,
+        )
+        for pk, lng, lat, _, _ in updates
+    ]
+    with transaction.atomic():
+        Property.objects.bulk_update(listings, ['location', 'latitude', 'longitude', 'geohash', 'updated_at'])
+        properties_relocated.send(
+            sender=Property,
+            ids=[update[0] for update in updates],
+            previous=[update[3] for update in updates if update[3] is not None],
+        )
+
+
+def backfill(gazetteer=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Geocode every listing in primary-key batches; returns a Counter of rows per source
+    plus 'unresolved'.
+    """
+    counts, after = Counter(), 0
+    while True:
+        rows = load_batch(after, batch_size)
+        if not rows:
+            return counts
+        after = rows[-1][0]
+        updates, unresolved = plan_batch(rows, gazetteer)
+        counts.update(update[4] for update in updates)
+        counts['unresolved'] += unresolved
+        if not dry_run:
+            write_updates(updates)
@@ -0,0 +1,58 @@
+"""Minimal geohash encoding used to bucket property locations into grid cells."""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Length of the geohash stored on Property
+PRECISION = 12
+
+
+def encode(lat, lng, precision=PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return (lat_height, lng_width) in degrees of a cell at precision."""
+    lng_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision - lng_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def cover(bbox, precision):
+    """Return the geohash cells at precision intersecting a (min_lng, min_lat, max_lng, max_lat) box."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    height, width = cell_size(precision)
+    rows = int(round(180.0 / height))
+    cols = int(round(360.0 / width))
+    first_row, last_row = [min(int((lat + 90.0) // height), rows - 1) for lat in (min_lat, max_lat)]
+    first_col, last_col = [min(int((lng + 180.0) // width), cols - 1) for lng in (min_lng, max_lng)]
+    return [
+        encode(-90.0 + (row + 0.5) * height, -180.0 + (col + 0.5) * width, precision)
+        for row in range(first_row, last_row + 1)
+        for col in range(first_col, last_col + 1)
+    ]
+
+
+def prefix_range(prefix):
+    """Return (low, high) bounds matching every geohash starting with prefix.
+
+    Used instead of LIKE so the lookup stays an index range scan on SQLite.
+    """
+    # '{' sorts right after 'z', the last geohash character
+    return prefix, prefix + '{'
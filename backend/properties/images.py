@@ -0,0 +1,147 @@
+"""Background generation of resized image variants for MediaProperty uploads.
+
+Resizing runs in a process pool so the request that stored the original never
+waits on Pillow, and CPU-heavy decoding does not hold the GIL of the web worker.
+The pool spawns its workers: forking the threaded web process could copy a lock
+held by another thread into the child. Results are written back to
+``MediaProperty.variants`` as ``{name: {'name': <storage path>, 'width': w,
+'height': h}}`` plus the dimensions of the original and the source path they
+were generated from.
+
+Once no MediaProperty refers to an original any more (the row was deleted or
+its image replaced), the original and its variants are removed from storage.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# name -> (longest edge in pixels, Pillow format, file extension)
+VARIANTS = {
+    'thumbnail': (320, 'JPEG', 'jpg'),
+    'medium': (1280, 'JPEG', 'jpg'),
+    'webp': (1280, 'WEBP', 'webp'),
+}
+VARIANT_DIR = 'property_images/variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_variants(media_root, source_name):
+    """Resize one original into every variant. Runs in a worker process; no Django/DB access."""
+    from PIL import Image, ImageOps
+
+    # the full storage name (path and extension) is unique, so variants of
+    # a/photo.jpg, b/photo.jpg and photo.png never share a file
+    prefix = f'{VARIANT_DIR}/{source_name}'
+    variants = {'source': source_name}
+    with Image.open(os.path.join(media_root, source_name)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    variants['original'] = {'width': image.width, 'height': image.height}
+
+    os.makedirs(os.path.dirname(os.path.join(media_root, prefix)), exist_ok=True)
+    for name, (edge, image_format, extension) in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        variant_name = f'{prefix}_{name}.{extension}'
+        resized.save(os.path.join(media_root, variant_name), image_format, quality=82, optimize=True)
+        variants[name] = {'name': variant_name, 'width': resized.width, 'height': resized.height}
+    return variants
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PROPERTY_IMAGE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _executor
+
+
+def needs_variants(media):
+    return bool(media.Images) and (media.variants or {}).get('source') != media.Images.name
+
+
+def variant_names(variants):
+    return [
+        variant['name'] for name, variant in (variants or {}).items()
+        if name in VARIANTS and isinstance(variant, dict) and variant.get('name')
+    ]
+
+
+def delete_image_files(name, variants, keep=()):
+    """Remove an original and its variants from storage unless a MediaProperty still uses it."""
+    from .models import MediaProperty
+
+    if not name or MediaProperty.objects.filter(Images=name).exists():
+        return
+    stored = [(MediaProperty._meta.get_field('Images').storage, name)]
+    stored += [(default_storage, variant) for variant in variant_names(variants) if variant not in keep]
+    for storage, path in stored:
+        try:
+            storage.delete(path)
+        except OSError:
+            logger.warning('Could not delete image file %s', path)
+
+
+def store_variants(media_id, variants):
+    from .cache import mark_listing_changed
+    from .models import MediaProperty
+
+    previous = MediaProperty.objects.filter(pk=media_id).values_list('variants', flat=True).first()
+    MediaProperty.objects.filter(pk=media_id).update(variants=variants)
+    if previous and previous.get('source') != variants['source']:
+        # the row's image was replaced; its former original may now be unused
+        delete_image_files(previous.get('source'), previous, keep=variant_names(variants))
+    property_id = MediaProperty.objects.filter(pk=media_id).values_list('property_id', flat=True).first()
+    if property_id is not None:
+        mark_listing_changed(property_id)
+
+
+def _on_done(media_id, future):
+    # runs on an executor callback thread in the web process, which owns its own connection
+    try:
+        store_variants(media_id, future.result())
+    except Exception:
+        logger.exception('Could not generate image variants for MediaProperty %s', media_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(media_items):
+    """Queue variant generation for MediaProperty rows whose originals changed."""
+    try:
+        media_root = default_storage.path('')
+    except NotImplementedError:
+        # remote storages have no local path for Pillow to read from
+        return
+    workers = getattr(settings, 'PROPERTY_IMAGE_WORKERS', 2)
+    for media in media_items:
+        if not needs_variants(media):
+            continue
+        if workers == 0:
+            try:
+                store_variants(media.pk, render_variants(media_root, media.Images.name))
+            except Exception:
+                logger.exception('Could not generate image variants for MediaProperty %s', media.pk)
+            continue
+        future = get_executor().submit(render_variants, media_root, media.Images.name)
+        future.add_done_callback(lambda f, media_id=media.pk: _on_done(media_id, f))
+
+
+def variant_url(name, variants, size):
+    """URL of the requested size for an image, falling back to the original."""
+    variant = (variants or {}).get(size)
+    if variant:
+        return default_storage.url(variant['name'])
+    return default_storage.url(name) if name else None
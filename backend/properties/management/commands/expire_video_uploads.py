@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from properties import uploads
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete chunked video uploads that were never finished and have been idle for '
+        'PROPERTY_UPLOAD_EXPIRY_HOURS, together with their partial files.'
+    )
+
+    def handle(self, *args, **options):
+        removed = uploads.expire_uploads()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} abandoned uploads.'))
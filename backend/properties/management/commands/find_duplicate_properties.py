@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from properties import dedupe
+
+
+class Command(BaseCommand):
+    help = (
+        'Find near-duplicate listings with MinHash/LSH over title and description, '
+        'location and price, and queue them for review in DuplicateCandidate.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=dedupe.TEXT_THRESHOLD,
+                            help='Minimum estimated text similarity (0-1)')
+        parser.add_argument('--max-distance', type=float, default=dedupe.MAX_DISTANCE_M,
+                            help='Maximum distance between the listings in metres')
+        parser.add_argument('--price-tolerance', type=float, default=dedupe.PRICE_TOLERANCE,
+                            help='Maximum price difference relative to the higher price')
+        parser.add_argument('--dry-run', action='store_true', help='Print the pairs instead of storing them')
+
+    def handle(self, *args, **options):
+        matches = dedupe.find_duplicates(
+            threshold=options['threshold'],
+            max_distance_m=options['max_distance'],
+            price_tolerance=options['price_tolerance'],
+        )
+        if options['dry_run']:
+            for original, duplicate, similarity, distance_m, price_gap in matches:
+                self.stdout.write(f'{duplicate} -> {original}: text {similarity:.2f}, {distance_m:.0f} m, price {price_gap:.1%}')
+            return
+        created = dedupe.record_duplicates(matches)
+        self.stdout.write(self.style.SUCCESS(f'Queued {created} new duplicate candidates for review.'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from properties import geocoding
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill Property.location, latitude and longitude in batches: from each other where '
+        'one side is set, otherwise from the address or city via a local gazetteer file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gazetteer', help='GeoNames dump or CSV (name, latitude, longitude[, alternate_names, population])')
+        parser.add_argument('--batch-size', type=int, default=geocoding.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Count the rows that would change without writing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        gazetteer = None
+        if options['gazetteer']:
+            try:
+                gazetteer = geocoding.Gazetteer.load(options['gazetteer'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Could not load gazetteer: {exc}')
+            self.stdout.write(f'Loaded {len(gazetteer)} gazetteer places.')
+
+        counts = geocoding.backfill(gazetteer, options['batch_size'], options['dry_run'])
+        changed = sum(counts[source] for source in geocoding.SOURCES)
+        summary = ', '.join(f'{counts[source]} from {source}' for source in geocoding.SOURCES)
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {changed} listings ({summary}); {counts["unresolved"]} could not be placed.'
+        ))
@@ -0,0 +1,179 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from properties import geohash
+from properties.models import Features, ImportCheckpoint, MediaProperty, Property, coordinate
+from properties.signals import properties_imported
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+# Row keys accepted as-is for Property columns
+SCALAR_COLUMNS = (
+    'title', 'description', 'price', 'type', 'area', 'rooms', 'bedrooms',
+    'bathrooms', 'status', 'city',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a CSV or JSONL feed of listings into Property, Features and MediaProperty '
+        'with per-chunk bulk inserts. Re-running resumes after the last committed chunk; the resume '
+        'point is stored in ImportCheckpoint in the same transaction as the chunk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--owner', help='Username owning rows that have no "owner" column')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--checkpoint', help='Checkpoint name (default: the absolute path of the file)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        source = os.path.abspath(path)
+        checkpoint = options['checkpoint'] or source
+        chunk_size = max(1, options['chunk_size'])
+
+        self.owners = {}
+        try:
+            self.default_owner = self.get_owner(options['owner']) if options['owner'] else None
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0])
+
+        done = 0 if options['restart'] else self.read_checkpoint(checkpoint, source)
+        if done:
+            self.stdout.write(f'Resuming after row {done}.')
+
+        imported = skipped = 0
+        with open(path, newline='', encoding='utf-8') as handle:
+            rows = enumerate(self.read_rows(handle, fmt), start=1)
+            rows = islice(rows, done, None)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                valid, errors = self.validate_chunk(chunk)
+                for line, message in errors:
+                    self.stderr.write(f'row {line}: {message}')
+                done = chunk[-1][0]
+                # committed together, so a crash can't leave imported rows behind the checkpoint
+                with transaction.atomic():
+                    self.write_chunk(valid)
+                    self.write_checkpoint(checkpoint, source, done)
+                imported += len(valid)
+                skipped += len(errors)
+                self.stdout.write(f'{done} rows read, {imported} imported, {skipped} skipped')
+
+        self.stdout.write(self.style.SUCCESS(f'Import finished: {imported} imported, {skipped} skipped.'))
+
+    # input -------------------------------------------------------------
+
+    def read_rows(self, handle, fmt):
+        if fmt == 'csv':
+            yield from csv.DictReader(handle)
+            return
+        # parsed in validate_chunk so a malformed line is reported rather than fatal
+        yield from handle
+
+    def read_checkpoint(self, name, source):
+        state = ImportCheckpoint.objects.filter(name=name).first()
+        if state is None:
+            return 0
+        if state.source != source:
+            raise CommandError(f'Checkpoint "{name}" belongs to {state.source}; use --restart or --checkpoint')
+        return state.rows
+
+    def write_checkpoint(self, name, source, rows):
+        ImportCheckpoint.objects.update_or_create(name=name, defaults={'source': source, 'rows': rows})
+
+    # validation --------------------------------------------------------
+
+    def get_owner(self, username):
+        if username not in self.owners:
+            # misses are cached too, so a feed full of one bad owner costs a single query
+            self.owners[username] = get_user_model().objects.filter(username=username).first()
+        if self.owners[username] is None:
+            raise ValidationError(f'Unknown owner "{username}"')
+        return self.owners[username]
+
+    def split_list(self, value):
+        if isinstance(value, list):
+            return [str(v).strip() for v in value if str(v).strip()]
+        return [v.strip() for v in str(value or '').split('|') if v.strip()]
+
+    def build_property(self, row):
+        owner = self.get_owner(row['owner']) if row.get('owner') else self.default_owner
+        if owner is None:
+            raise ValidationError('no owner column and no --owner given')
+
+        data = {column: row[column] for column in SCALAR_COLUMNS if row.get(column) not in (None, '')}
+        prop = Property(owner=owner, adress=row.get('address') or row.get('adress') or '', **data)
+        prop.is_published = str(row.get('is_published', '')).lower() in TRUE_VALUES
+
+        lat, lng = row.get('latitude') or row.get('lat'), row.get('longitude') or row.get('lng')
+        if lat not in (None, '') and lng not in (None, ''):
+            try:
+                lat, lng = float(lat), float(lng)
+            except ValueError:
+                raise ValidationError('latitude/longitude must be numbers')
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                raise ValidationError('latitude/longitude out of range')
+            prop.location = Point(lng, lat, srid=4326)
+            prop.latitude, prop.longitude = coordinate(lat), coordinate(lng)
+
+        prop.full_clean(exclude=['owner'], validate_unique=False, validate_constraints=False)
+        # bulk_create skips save(), so derived columns are filled here
+        prop.geohash = geohash.encode(prop.location.y, prop.location.x)
+        return prop
+
+    def validate_chunk(self, chunk):
+        valid, errors = [], []
+        for line, row in chunk:
+            try:
+                if isinstance(row, str):
+                    if not row.strip():
+                        continue
+                    try:
+                        row = json.loads(row)
+                    except json.JSONDecodeError as exc:
+                        errors.append((line, f'invalid JSON: {exc}'))
+                        continue
+                    if not isinstance(row, dict):
+                        raise ValidationError('expected a JSON object')
+                prop = self.build_property(row)
+            except (TypeError, ValueError) as exc:
+                # conversions that full_clean doesn't wrap, e.g. a non-numeric price from a JSON feed
+                errors.append((line, f'invalid value: {exc}'))
+                continue
+            except ValidationError as exc:
+                errors.append((line, '; '.join(exc.messages)))
+                continue
+            valid.append((prop, self.split_list(row.get('features')), self.split_list(row.get('images'))))
+        return valid, errors
+
+    # output ------------------------------------------------------------
+
+    def write_chunk(self, valid):
+        if not valid:
+            return
+        properties = Property.objects.bulk_create([prop for prop, _, _ in valid])
+        features, media = [], []
+        for prop, (_, feature_names, image_names) in zip(properties, valid):
+            features.extend(Features(property=prop, features=name[:100]) for name in feature_names)
+            media.extend(MediaProperty(property=prop, Images=name) for name in image_names)
+        Features.objects.bulk_create(features)
+        media = MediaProperty.objects.bulk_create(media)
+        # bulk_create sends no post_save; let derived data (search index, caches...) catch up
+        properties_imported.send(sender=Property, ids=[prop.pk for prop in properties], media=media)
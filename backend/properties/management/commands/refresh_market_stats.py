@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from properties.market import refresh_all
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the price-per-square-metre statistics for every city and property type.'
+
+    def handle(self, *args, **options):
+        count = refresh_all()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {count} market groups.'))
@@ -0,0 +1,74 @@
+"""Materialized price-per-square-metre statistics (MarketStat) by city and type.
+
+Each (city, type) group is recomputed on its own: signals.py refreshes the
+group a listing left and the group it joined whenever one of
+Property.MARKET_FIELDS changes, so a save touches at most two groups instead of
+the whole table. ``manage.py refresh_market_stats`` rebuilds everything.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField
+
+from .models import MarketStat, Property
+
+# Listings that count as market evidence: live ones and closed deals
+MARKET_STATUSES = ('active', 'sold', 'rented')
+
+PERCENTILES = (25, 50, 75)
+
+PRICE_PER_SQM = ExpressionWrapper(F('price') / F('area'), output_field=FloatField())
+
+
+def market_listings():
+    return Property.objects.filter(status__in=MARKET_STATUSES, area__gt=0, price__gt=0)
+
+
+def _money(value):
+    return Decimal(str(round(float(value), 2)))
+
+
+def summarize(price_per_sqm):
+    """Return MarketStat column values for an array of price-per-m² figures."""
+    p25, median, p75 = np.percentile(price_per_sqm, PERCENTILES)
+    return {'count': len(price_per_sqm), 'p25': _money(p25), 'median': _money(median), 'p75': _money(p75)}
+
+
+def refresh_group(city, type):
+    """Recompute one group; removes its row when no listings are left."""
+    values = np.fromiter(
+        market_listings().filter(city=city, type=type)
+        .annotate(per_sqm=PRICE_PER_SQM).values_list('per_sqm', flat=True),
+        dtype=np.float64,
+    )
+    if not len(values):
+        MarketStat.objects.filter(city=city, type=type).delete()
+        return None
+    stat, _ = MarketStat.objects.update_or_create(city=city, type=type, defaults=summarize(values))
+    return stat
+
+
+def refresh_groups(groups):
+    for city, type in set(groups):
+        refresh_group(city, type)
+
+
+def refresh_all():
+    """Rebuild the whole table in one pass over the listings; returns the number of groups."""
+    rows = (
+        market_listings().order_by('city', 'type')
+        .annotate(per_sqm=PRICE_PER_SQM).values_list('city', 'type', 'per_sqm')
+    )
+    groups = {}
+    for city, type, per_sqm in rows.iterator(chunk_size=2000):
+        groups.setdefault((city, type), []).append(float(per_sqm))
+
+    stats = [
+        MarketStat(city=city, type=type, **summarize(np.array(values)))
+        for (city, type), values in groups.items()
+    ]
+    with transaction.atomic():
+        MarketStat.objects.all().delete()
+        MarketStat.objects.bulk_create(stats)
+    return len(stats)
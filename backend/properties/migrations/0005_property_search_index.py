@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 10:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0004_property_prop_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE properties_property_fts USING fts5("
+                "title, description, city, adress, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+                "INSERT INTO properties_property_fts (rowid, title, description, city, adress) "
+                "SELECT id, title, description, city, adress FROM properties_property",
+            ],
+            reverse_sql=['DROP TABLE properties_property_fts'],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+from properties.geohash import encode
+
+
+def backfill_geohash(apps, schema_editor):
+    Property = apps.get_model('properties', 'Property')
+    batch = []
+    for prop in Property.objects.only('id', 'location').iterator(chunk_size=2000):
+        prop.geohash = encode(prop.location.y, prop.location.x) if prop.location else ''
+        batch.append(prop)
+        if len(batch) >= 2000:
+            Property.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Property.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0005_property_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
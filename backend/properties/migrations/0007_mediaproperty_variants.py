@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0006_property_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaproperty',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
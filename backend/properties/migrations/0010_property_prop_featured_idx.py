@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0009_property_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('featured_until__isnull', False), ('is_published', True)), fields=['featured_until'], name='prop_featured_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1 on 2026-10-18 16:10
+
+from decimal import Decimal
+
+import numpy as np
+from django.db import migrations, models
+
+
+def build_stats(apps, schema_editor):
+    Property = apps.get_model('properties', 'Property')
+    MarketStat = apps.get_model('properties', 'MarketStat')
+    groups = {}
+    rows = Property.objects.filter(
+        status__in=('active', 'sold', 'rented'), area__gt=0, price__gt=0
+    ).values_list('city', 'type', 'price', 'area')
+    for city, type, price, area in rows.iterator(chunk_size=2000):
+        groups.setdefault((city, type), []).append(float(price) / area)
+    stats = []
+    for (city, type), values in groups.items():
+        p25, median, p75 = (Decimal(str(round(v, 2))) for v in np.percentile(values, (25, 50, 75)))
+        stats.append(MarketStat(city=city, type=type, count=len(values), p25=p25, median=median, p75=p75))
+    MarketStat.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0010_property_prop_featured_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('type', models.CharField(choices=[('House', 'House'), ('Apartment', 'Apartment'), ('Office', 'Office'), ('Land', 'Land'), ('Villa', 'Villa'), ('Shop', 'Shop'), ('Warehouse', 'Warehouse')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('p25', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('median', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('p75', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['city', 'type'],
+                'constraints': [models.UniqueConstraint(fields=('city', 'type'), name='marketstat_city_type_uniq')],
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
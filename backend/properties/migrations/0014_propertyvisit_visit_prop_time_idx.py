@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0013_duplicatecandidate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='propertyvisit',
+            index=models.Index(fields=['property', 'scheduled_time'], name='visit_prop_time_idx'),
+        ),
+    ]
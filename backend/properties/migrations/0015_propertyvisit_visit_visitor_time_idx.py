@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0014_propertyvisit_visit_prop_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='propertyvisit',
+            index=models.Index(fields=['visitor', 'scheduled_time'], name='visit_visitor_time_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0015_propertyvisit_visit_visitor_time_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='property',
+            name='prop_pub_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', '-id'], name='prop_pub_created_idx'),
+        ),
+    ]
@@ -1,9 +1,29 @@
+import uuid
+from decimal import Decimal
+
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User
 from datetime import timezone
 from django.contrib.gis.db import models
+from django.contrib.gis.geos import Point
 from django.core.validators import FileExtensionValidator
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from . import geohash
+from .filters import radius_bbox
+
+# Placeholder every listing starts at until it is given coordinates
+DEFAULT_LOCATION = 'POINT(34.888822 -6.369028)'
+DEFAULT_POINT = (34.888822, -6.369028)
+
+# latitude/longitude hold 12 decimal places
+COORDINATE_QUANTUM = Decimal('1e-12')
+
+
+def coordinate(value):
+    return Decimal(repr(float(value))).quantize(COORDINATE_QUANTUM)
+
 
 PROPERTY_TYPES = (
         ('House', 'House'),
@@ -39,6 +59,69 @@ class AgentProfile(models.Model):
         app_label = 'properties'
 
 
+# Columns behind the compact card representation of the listing grid
+CARD_COLUMNS = (
+    'id', 'title', 'price', 'city', 'type', 'status', 'rooms', 'bedrooms',
+    'bathrooms', 'area', 'is_published', 'created_at',
+)
+
+
+class PropertyQuerySet(models.QuerySet):
+    def with_main_image(self):
+        main_image = MediaProperty.objects.filter(property=OuterRef('pk')).exclude(Images='').exclude(Images__isnull=True).order_by('id')
+        return self.annotate(
+            main_image=Subquery(main_image.values('Images')[:1]),
+            main_image_variants=Subquery(main_image.values('variants')[:1]),
+        )
+
+    def with_listing_data(self, fields=None):
+        """Load everything SerializerProperty reads in a fixed number of queries.
+
+        Owner and profile are joined, media and features are prefetched and the
+        main image path is annotated, so rendering a page does not issue one
+        query per row regardless of the page size. When ``fields`` (serializer
+        field names) is given, only the columns and relations those fields need
+        are loaded.
+        """
+        def wanted(name):
+            return fields is None or name in fields
+
+        queryset = self
+        if fields is not None:
+            concrete = {f.name for f in Property._meta.concrete_fields}
+            columns = {'id', 'created_at'} | {name for name in fields if name in concrete}
+            if wanted('address'):
+                columns.add('adress')
+            if wanted('agent'):
+                columns.add('owner')
+            queryset = queryset.only(*columns)
+        if wanted('agent'):
+            queryset = queryset.select_related('owner__profile')
+        if wanted('MediaProperty'):
+            queryset = queryset.prefetch_related(
+                Prefetch('MediaProperty', queryset=MediaProperty.objects.order_by('id'))
+            )
+        if wanted('Features_Property'):
+            queryset = queryset.prefetch_related('Features_Property')
+        if wanted('main_image_url'):
+            queryset = queryset.with_main_image()
+        return queryset
+
+    def placed(self):
+        """Listings with a real position: located, and not at the DEFAULT_LOCATION placeholder."""
+        return self.exclude(location__isnull=True).exclude(location=DEFAULT_LOCATION)
+
+    def for_cards(self):
+        """Only the card columns, the main image and media/feature counts; no nested rows."""
+        def count_of(model):
+            rows = model.objects.filter(property=OuterRef('pk')).order_by().values('property')
+            return Coalesce(Subquery(rows.annotate(n=Count('id')).values('n')), 0)
+
+        return self.only(*CARD_COLUMNS).with_main_image().annotate(
+            media_count=count_of(MediaProperty), feature_count=count_of(Features),
+        )
+
+
 class Property(models.Model):
     #basic property informations
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='properties')
@@ -59,9 +142,11 @@ class Property(models.Model):
     #location
     city = models.CharField(max_length=100)
     adress = models.CharField(max_length=300, blank=True)
-    location = models.PointField(default='POINT(34.888822 -6.369028)')
+    location = models.PointField(default=DEFAULT_LOCATION)
     latitude = models.DecimalField(max_digits=20, decimal_places=12, null=True, blank=True)
     longitude = models.DecimalField(max_digits=20, decimal_places=12, null=True, blank=True)
+    # derived from location on save; grouping on its prefixes clusters the map
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     
     # Publishing & Business Logic
     is_published = models.BooleanField(default=False)
@@ -73,13 +158,61 @@ class Property(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PropertyQuerySet.as_manager()
+
+    # columns feeding MarketStat; their loaded values tell signals which groups changed
+    MARKET_FIELDS = ('city', 'type', 'price', 'area', 'status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in field_names for name in cls.MARKET_FIELDS):
+            instance._market_snapshot = tuple(getattr(instance, name) for name in cls.MARKET_FIELDS)
+        if 'is_published' in field_names:
+            # lets signals tell a publish apart from an edit of a published listing
+            instance._was_published = instance.is_published
+        if 'location' in field_names:
+            # the tiles at the old position go stale when a listing moves
+            instance._loaded_point = (instance.location.x, instance.location.y) if instance.location else None
+        if 'latitude' in field_names and 'longitude' in field_names:
+            instance._loaded_lat_lng = (instance.latitude, instance.longitude)
+        return instance
+
+    def sync_coordinates(self):
+        """Make location, latitude and longitude agree before a save.
+
+        A location moved off what was loaded (or off the placeholder, for a new
+        listing) wins; otherwise edited latitude/longitude, or ones set while
+        location is still the placeholder, move the location. Listings with
+        neither keep the placeholder and empty latitude/longitude.
+        """
+        point = (self.location.x, self.location.y) if self.location else None
+        moved = point != getattr(self, '_loaded_point', DEFAULT_POINT)
+        has_lat_lng = self.latitude is not None and self.longitude is not None
+        lat_lng_edited = (self.latitude, self.longitude) != getattr(self, '_loaded_lat_lng', (None, None))
+
+        if has_lat_lng and not moved and (lat_lng_edited or point in (None, DEFAULT_POINT)):
+            self.location = Point(float(self.longitude), float(self.latitude), srid=4326)
+        elif point not in (None, DEFAULT_POINT):
+            self.latitude, self.longitude = coordinate(point[1]), coordinate(point[0])
+        else:
+            self.latitude = self.longitude = None
+
+    def save(self, *args, **kwargs):
+        self.sync_coordinates()
+        self.geohash = geohash.encode(self.location.y, self.location.x) if self.location else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'location', 'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'location', 'latitude', 'longitude', 'geohash'}
+        super().save(*args, **kwargs)
+        self._loaded_point = (self.location.x, self.location.y) if self.location else None
+        self._loaded_lat_lng = (self.latitude, self.longitude)
+
     def get_lat_lng(self):
-        """Extract latitude and longitude from the location field."""
+        """Return (latitude, longitude) of the location, or (None, None) without one."""
         if self.location:
-            lat_lng = self.location.split(',')
-            if len(lat_lng) == 2:
-                return lat_lng[0], lat_lng[1]
-        return '0', '0'  # default values
+            return self.location.y, self.location.x
+        return None, None
 
 
     def __str__(self):
@@ -87,7 +220,49 @@ class Property(models.Model):
     
     class Meta:
         app_label = 'properties'
+        indexes = [
+            # backs keyset pagination of the property feed
+            models.Index(fields=['-created_at', '-id'], name='prop_created_id_idx'),
+            # the public feed: is_published=True compiles to a bare boolean column,
+            # which SQLite can only match against a partial index's WHERE clause
+            models.Index(
+                fields=['-created_at', '-id'], name='prop_pub_created_idx',
+                condition=models.Q(is_published=True),
+            ),
+            # filtered feeds: equality column first, then the keyset ordering
+            models.Index(fields=['status', '-created_at', '-id'], name='prop_status_created_idx'),
+            models.Index(fields=['city', '-created_at', '-id'], name='prop_city_created_idx'),
+            # equality filters followed by the price range
+            models.Index(fields=['city', 'type', 'price'], name='prop_city_type_price_idx'),
+            models.Index(fields=['type', 'price'], name='prop_type_price_idx'),
+            # only the handful of featured listings, for the homepage carousel
+            models.Index(
+                fields=['featured_until'], name='prop_featured_idx',
+                condition=models.Q(is_published=True, featured_until__isnull=False),
+            ),
+        ]
         
+class MarketStat(models.Model):
+    """Price per square metre of the listings in one (city, type) group.
+
+    Materialized by market.py and kept current as listings change.
+    """
+    city = models.CharField(max_length=100)
+    type = models.CharField(max_length=20, choices=PROPERTY_TYPES)
+    count = models.PositiveIntegerField(default=0)
+    p25 = models.DecimalField(max_digits=14, decimal_places=2)
+    median = models.DecimalField(max_digits=14, decimal_places=2)
+    p75 = models.DecimalField(max_digits=14, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'properties'
+        ordering = ['city', 'type']
+        constraints = [
+            models.UniqueConstraint(fields=['city', 'type'], name='marketstat_city_type_uniq'),
+        ]
+
+
 class MediaProperty(models.Model):
     property = models.ForeignKey(Property, related_name="MediaProperty", on_delete=models.CASCADE, null=True, blank=True)
     Images = models.ImageField(upload_to='property_images/', null=True, blank=False)
@@ -95,10 +270,35 @@ class MediaProperty(models.Model):
     caption = models.TextField(max_length=100, blank=True, 
                                validators = [FileExtensionValidator(allowed_extensions=['mp4', 'mov', 'avi', 'webm'])]
                                )
+    # resized renditions of Images, filled in by the background pipeline in images.py
+    variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         app_label = 'properties'
         
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'webm']
+
+
+class VideoUpload(models.Model):
+    """A resumable, chunked upload of a property video (see uploads.py).
+
+    Bytes are appended to a partial file under PROPERTY_UPLOAD_TEMP_DIR;
+    ``offset`` is how many of ``size`` bytes have been received so far.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_uploads')
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    media = models.OneToOneField(MediaProperty, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'properties'
+
+
 class Features(models.Model):
     features = models.CharField(max_length=100)
     property = models.ForeignKey(Property,related_name="Features_Property", on_delete=models.SET_NULL, null=True, blank=True)
@@ -127,3 +327,105 @@ class PropertyVisit(models.Model):
     class Meta:
         app_label = 'properties'
         ordering = ['scheduled_time']
+        indexes = [
+            # interval lookups for conflict checks and availability (see visits.py)
+            models.Index(fields=['property', 'scheduled_time'], name='visit_prop_time_idx'),
+            # a visitor's calendar
+            models.Index(fields=['visitor', 'scheduled_time'], name='visit_visitor_time_idx'),
+        ]
+
+
+class SavedSearch(models.Model):
+    """A buyer's stored filter; alerts.py notifies them when a matching listing is published.
+
+    Empty city/type and null bounds match anything. ``city_key`` and the
+    bounding box of the radius are derived on save so candidate searches for a
+    listing can be found through the (is_active, city_key, type) index.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100)
+    city = models.CharField(max_length=100, blank=True)
+    type = models.CharField(max_length=20, choices=PROPERTY_TYPES, blank=True)
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    min_bedrooms = models.PositiveIntegerField(null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    radius_km = models.FloatField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_notified_at = models.DateTimeField(null=True, blank=True)
+
+    city_key = models.CharField(max_length=100, blank=True, editable=False)
+    min_lat = models.FloatField(null=True, editable=False)
+    max_lat = models.FloatField(null=True, editable=False)
+    min_lng = models.FloatField(null=True, editable=False)
+    max_lng = models.FloatField(null=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.city_key = self.city.strip().lower()
+        if self.radius_km and self.latitude is not None and self.longitude is not None:
+            center = Point(self.longitude, self.latitude, srid=4326)
+            self.min_lng, self.min_lat, self.max_lng, self.max_lat = radius_bbox(center, self.radius_km)
+        else:
+            self.min_lng = self.min_lat = self.max_lng = self.max_lat = None
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
+
+    class Meta:
+        app_label = 'properties'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'city_key', 'type'], name='savedsearch_match_idx'),
+        ]
+
+
+class DuplicateCandidate(models.Model):
+    """A listing that looks like a repost of an older one, found by dedupe.py, awaiting review."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('confirmed', 'Confirmed'),
+        ('dismissed', 'Dismissed'),
+    )
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='duplicate_of')
+    original = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='duplicates')
+    similarity = models.FloatField(help_text="Estimated Jaccard similarity of title and description")
+    distance_m = models.FloatField()
+    price_gap = models.FloatField(help_text="Price difference relative to the higher price")
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.property_id} duplicates {self.original_id}"
+
+    class Meta:
+        app_label = 'properties'
+        ordering = ['-similarity']
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'original'], name='duplicate_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-similarity'], name='duplicate_status_idx'),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """How far import_properties got through a feed.
+
+    Written in the same transaction as each imported chunk, so a crash can never
+    leave rows committed that a resumed run would import again.
+    """
+    name = models.CharField(max_length=500, unique=True)
+    source = models.CharField(max_length=1024)
+    rows = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.rows} rows"
+
+    class Meta:
+        app_label = 'properties'
@@ -0,0 +1,84 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+
+# SQLite FTS5 table mirroring the searchable Property columns; rowid == Property.id
+FTS_TABLE = 'properties_property_fts'
+FTS_COLUMNS = ('title', 'description', 'city', 'adress')
+
+# Upper bound on ranked results served for one query (after filtering)
+MAX_RESULTS = getattr(settings, 'PROPERTY_SEARCH_MAX_RESULTS', 1000)
+MAX_TERMS = 8
+
+_SELECT_SOURCE = f"SELECT id, {', '.join(FTS_COLUMNS)} FROM properties_property"
+_INSERT = f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Terms are quoted so FTS5 operators and column filters typed by users are
+    treated as plain words.
+    """
+    terms = re.findall(r'\w+', text or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def index_property(instance):
+    """Insert or refresh a single property's search row."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [instance.pk])
+        cursor.execute(
+            _INSERT + f"VALUES (%s, {', '.join(['%s'] * len(FTS_COLUMNS))})",
+            [instance.pk] + [getattr(instance, column) or '' for column in FTS_COLUMNS],
+        )
+
+
+def index_properties(ids):
+    """Refresh the search rows for many properties with two set-based statements."""
+    ids = list(ids)
+    if not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(_INSERT + _SELECT_SOURCE + f' WHERE id IN ({placeholders})', ids)
+
+
+def remove_property(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index():
+    """Repopulate the whole index from properties_property and merge its b-trees."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_INSERT + _SELECT_SOURCE)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def apply_search(queryset, text, order=True):
+    """Restrict queryset to full-text matches for text, ordered by bm25 rank when order is set.
+
+    The FTS table is joined on rowid, so the match, the queryset's own filters
+    and the ranking run in one statement; callers cap the filtered result
+    (see SearchPagination) rather than the raw matches.
+    """
+    query = build_match_query(text)
+    if query is None:
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    queryset = queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[query],
+    )
+    if order:
+        queryset = queryset.extra(select={'search_rank': f'{FTS_TABLE}.rank'}, order_by=['search_rank', '-id'])
+    return queryset
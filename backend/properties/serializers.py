@@ -1,12 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
-from .models import AgentProfile, Property, MediaProperty, Features, PropertyVisit
+from .models import (
+    AgentProfile, Property, MediaProperty, Features, PropertyVisit, VideoUpload, MarketStat, SavedSearch,
+    CARD_COLUMNS, VIDEO_EXTENSIONS,
+)
 from accounts.models import Profile
+from .cache import batched_listing_changes, mark_listing_changed
+from .filters import MAX_RADIUS_KM
+from .visits import ACTIVE_STATUSES, find_conflict, lock_property
+from .images import VARIANTS, schedule_variants, variant_url
 
 
 class MediaPropertySerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = MediaProperty
-        fields = ['id', 'Images', 'videos', 'caption']
+        fields = ['id', 'Images', 'videos', 'caption', 'variants']
+
+    def get_variants(self, obj):
+        # thumbnail / medium / webp renditions, empty until the background pipeline ran
+        return {
+            name: {'url': default_storage.url(v['name']), 'width': v['width'], 'height': v['height']}
+            for name, v in (obj.variants or {}).items() if name in VARIANTS
+        }
 
 
 class FeaturesSerializer(serializers.ModelSerializer):
@@ -15,9 +38,142 @@ class FeaturesSerializer(serializers.ModelSerializer):
         fields = ['id', 'features', 'property']
 
 class PropertyVisitSerializer(serializers.ModelSerializer):
+    # calendar labels; the list views join property and visitor in
+    property_title = serializers.CharField(source='property.title', read_only=True)
+    visitor_username = serializers.CharField(source='visitor.username', read_only=True)
+
     class Meta:
         model = PropertyVisit
-        fields = ['id', 'property', 'visitor', 'scheduled_time', 'status', 'notes', 'created_at']
+        fields = [
+            'id', 'property', 'property_title', 'visitor', 'visitor_username',
+            'scheduled_time', 'status', 'notes', 'created_at'
+        ]
+
+    def validate(self, attrs):
+        self.check_conflict(attrs)
+        return attrs
+
+    def check_conflict(self, attrs):
+        def value(name):
+            return attrs.get(name, getattr(self.instance, name, None))
+
+        prop, when, status = value('property'), value('scheduled_time'), value('status') or 'pending'
+        if prop is None or when is None or status not in ACTIVE_STATUSES:
+            return
+        conflict = find_conflict(prop.pk, when, exclude_pk=getattr(self.instance, 'pk', None))
+        if conflict is not None:
+            raise serializers.ValidationError(
+                {'scheduled_time': f'This property already has a visit at {conflict.scheduled_time.isoformat()}.'}
+            )
+
+    def save(self, **kwargs):
+        # Take the write lock before re-checking, so two bookings of one slot cannot both
+        # pass validate() (see lock_property: select_for_update is a no-op on SQLite).
+        with transaction.atomic():
+            prop = self.validated_data.get('property', getattr(self.instance, 'property', None))
+            if prop is not None:
+                lock_property(prop.pk)
+            self.check_conflict(self.validated_data)
+            return super().save(**kwargs)
+
+class MarketStatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MarketStat
+        fields = ['city', 'type', 'count', 'p25', 'median', 'p75', 'updated_at']
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = [
+            'id', 'name', 'city', 'type', 'min_price', 'max_price', 'min_bedrooms',
+            'latitude', 'longitude', 'radius_km', 'is_active', 'created_at', 'last_notified_at'
+        ]
+        read_only_fields = ['created_at', 'last_notified_at']
+
+    def validate(self, attrs):
+        def value(name):
+            # partial updates: fall back to the stored value
+            return attrs.get(name, getattr(self.instance, name, None))
+
+        latitude, longitude, radius = value('latitude'), value('longitude'), value('radius_km')
+        given = [v is not None for v in (latitude, longitude, radius)]
+        if any(given) and not all(given):
+            raise serializers.ValidationError('latitude, longitude and radius_km must be given together.')
+        if all(given):
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise serializers.ValidationError('Coordinates out of range.')
+            if not 0 < radius <= MAX_RADIUS_KM:
+                raise serializers.ValidationError({'radius_km': f'Must be between 0 and {MAX_RADIUS_KM}.'})
+        min_price, max_price = value('min_price'), value('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError({'min_price': 'Must not exceed max_price.'})
+        return attrs
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'property', 'filename', 'size', 'offset', 'media', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'property', 'offset', 'media', 'created_at', 'updated_at']
+
+    def validate_filename(self, value):
+        name = os.path.basename(value.replace('\\', '/'))
+        if os.path.splitext(name)[1][1:].lower() not in VIDEO_EXTENSIONS:
+            raise serializers.ValidationError(f"Allowed extensions: {', '.join(VIDEO_EXTENSIONS)}.")
+        return name
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.PROPERTY_VIDEO_MAX_SIZE:
+            raise serializers.ValidationError(f'Must be between 1 and {settings.PROPERTY_VIDEO_MAX_SIZE} bytes.')
+        return value
+
+
+def main_image_url(obj, size='medium'):
+    """URL of a property's first image at size, without a per-row query when data was preloaded."""
+    try:
+        # Prefer the prefetched gallery, then the annotated main image
+        # (see PropertyQuerySet.with_main_image); only query as a last resort.
+        cache = getattr(obj, '_prefetched_objects_cache', {})
+        if 'MediaProperty' in cache:
+            first_item = next((m for m in cache['MediaProperty'] if m.Images), None)
+        elif hasattr(obj, 'main_image'):
+            return variant_url(obj.main_image, getattr(obj, 'main_image_variants', None), size)
+        else:
+            first_item = obj.MediaProperty.exclude(Images='').exclude(Images__isnull=True).order_by('id').first()
+        if first_item is None:
+            return None
+        return variant_url(first_item.Images.name, first_item.variants, size)
+    except Exception:
+        return None
+
+
+def distance_km(obj):
+    # only present when the list view was asked for ?ordering=distance
+    distance = getattr(obj, 'distance', None)
+    return round(distance.km, 3) if distance is not None else None
+
+
+class PropertyCardSerializer(serializers.ModelSerializer):
+    """Compact list row for the listing grid (?view=card): no description or nested lists."""
+    main_image_url = serializers.SerializerMethodField()
+    media_count = serializers.IntegerField(read_only=True)
+    feature_count = serializers.IntegerField(read_only=True)
+    distance_km = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Property
+        fields = list(CARD_COLUMNS) + [
+            'main_image_url', 'media_count', 'feature_count', 'distance_km'
+        ]
+        read_only_fields = fields
+
+    def get_main_image_url(self, obj):
+        return main_image_url(obj, size='thumbnail')
+
+    def get_distance_km(self, obj):
+        return distance_km(obj)
+
 
 class SerializerProperty(serializers.ModelSerializer):
     # use the related_name from MediaProperty and Features models
@@ -26,6 +182,7 @@ class SerializerProperty(serializers.ModelSerializer):
     agent = serializers.SerializerMethodField()
     main_image_url = serializers.SerializerMethodField()
     address = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Property
@@ -34,10 +191,18 @@ class SerializerProperty(serializers.ModelSerializer):
             'rooms', 'bedrooms', 'bathrooms', 'area', 'city', 'address',
             'location', 'latitude', 'longitude', 'is_published', 'is_paid',
             'featured_until', 'view_count', 'owner', 'created_at', 'updated_at',
-            'MediaProperty', 'Features_Property', 'agent', 'main_image_url'
+            'MediaProperty', 'Features_Property', 'agent', 'main_image_url', 'distance_km'
         ]
         read_only_fields = ['owner', 'created_at', 'updated_at', 'view_count']
 
+    def __init__(self, *args, **kwargs):
+        # optional sparse fieldset, e.g. SerializerProperty(qs, many=True, fields=['id', 'title'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def get_agent(self, obj):
         try:
             user = obj.owner
@@ -52,19 +217,10 @@ class SerializerProperty(serializers.ModelSerializer):
             return {'id': None, 'username': None, 'name': None, 'phone': None}
 
     def get_main_image_url(self, obj):
-        try:
-            # Prefer first MediaProperty image
-            first = getattr(obj, 'MediaProperty', None)
-            if first is not None:
-                first_item = first.first()
-                if first_item and getattr(first_item, 'Images', None):
-                    try:
-                        return first_item.Images.url
-                    except Exception:
-                        return None
-        except Exception:
-            return None
-        return None
+        return main_image_url(obj)
+
+    def get_distance_km(self, obj):
+        return distance_km(obj)
 
     def get_address(self, obj):
         # model currently has a typo 'adress' — expose it as 'address' for API consistency
@@ -78,38 +234,23 @@ class SerializerProperty(serializers.ModelSerializer):
         if owner is not None:
             validated_data['owner'] = owner
 
-        property_instance = Property.objects.create(**validated_data)
-
         request = self.context.get('request') if hasattr(self, 'context') else None
-        # Accept multiple possible upload keys for backwards-compatibility
-        file_keys = ['MediaProperty', 'ImagesProperty', 'images', 'media']
-        if request is not None:
-            for key in file_keys:
-                files = request.FILES.getlist(key)
-                for f in files:
-                    # MediaProperty model field for image is 'Images'
-                    MediaProperty.objects.create(property=property_instance, Images=f)
-
+        feature_names = feature_values(features_data)
+        if request is not None and hasattr(request.POST, 'getlist'):
             # Features can be provided as repeated form fields
-            if hasattr(request.POST, 'getlist'):
-                feats = request.POST.getlist('Features_Property') or request.POST.getlist('features')
-                for feat in feats:
-                    Features.objects.create(property=property_instance, features=feat)
-
-        # If nested JSON was provided, create related instances too
-        for m in media_data:
-            # m may be a dict like {'Images': <file>} or {'Images': <url>}
-            img = m.get('Images') if isinstance(m, dict) else None
-            MediaProperty.objects.create(property=property_instance, Images=img)
-
-        for feat in features_data:
-            if isinstance(feat, dict):
-                val = feat.get('features')
-            else:
-                val = feat
-            if val:
-                Features.objects.create(property=property_instance, features=val)
+            feature_names = (request.POST.getlist('Features_Property') or request.POST.getlist('features')) + feature_names
+
+        # uploads hit storage before the transaction so no connection is held open meanwhile
+        images, written = store_images(uploaded_files(request) + media_images(media_data))
+        try:
+            with transaction.atomic():
+                property_instance = Property.objects.create(**validated_data)
+                media = write_nested(property_instance, images, feature_names)
+        except Exception:
+            delete_stored(written)
+            raise
 
+        transaction.on_commit(lambda: schedule_variants(media))
         return property_instance
 
     def update(self, instance, validated_data):
@@ -120,6 +261,7 @@ class SerializerProperty(serializers.ModelSerializer):
         - If 'Features_Property' is present in the payload, replace existing Features with the provided list.
         - If 'MediaProperty' is present in the payload, replace existing MediaProperty items with the provided list.
         - If request.FILES contains upload keys, append those uploads to the media gallery.
+        All of it happens in one transaction.
         """
         media_data = validated_data.pop('MediaProperty', None)
         features_data = validated_data.pop('Features_Property', None)
@@ -127,37 +269,107 @@ class SerializerProperty(serializers.ModelSerializer):
         # Prevent owner changes via API
         validated_data.pop('owner', None)
 
-        # Update simple fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        # Replace features if provided
-        if features_data is not None:
-            # remove existing features
-            Features.objects.filter(property=instance).delete()
-            for feat in features_data:
-                if isinstance(feat, dict):
-                    val = feat.get('features')
-                else:
-                    val = feat
-                if val:
-                    Features.objects.create(property=instance, features=val)
-
-        # Replace media if provided (note: this will remove existing media records)
-        if media_data is not None:
-            MediaProperty.objects.filter(property=instance).delete()
-            for m in media_data:
-                img = m.get('Images') if isinstance(m, dict) else None
-                MediaProperty.objects.create(property=instance, Images=img)
-
-        # Handle uploaded files in the incoming request (append to gallery)
         request = self.context.get('request') if hasattr(self, 'context') else None
-        if request is not None:
-            file_keys = ['MediaProperty', 'ImagesProperty', 'images', 'media']
-            for key in file_keys:
-                files = request.FILES.getlist(key)
-                for f in files:
-                    MediaProperty.objects.create(property=instance, Images=f)
-
-        return instance
\ No newline at end of file
+        images, written = store_images(media_images(media_data or []) + uploaded_files(request))
+        try:
+            with transaction.atomic(), batched_listing_changes():
+                # Update simple fields
+                for attr, value in validated_data.items():
+                    setattr(instance, attr, value)
+                instance.save()
+
+                # Replace features / media if provided (removes the existing rows).
+                # A regular delete lets the collector null VideoUpload.media; the
+                # per-row signals mark the listing changed once, on exit.
+                if features_data is not None:
+                    Features.objects.filter(property=instance).delete()
+                if media_data is not None:
+                    MediaProperty.objects.filter(property=instance).delete()
+                media = write_nested(instance, images, feature_values(features_data or []))
+        except Exception:
+            # only files this request wrote; names passed through still belong to stored rows
+            delete_stored(written)
+            raise
+
+        transaction.on_commit(lambda: schedule_variants(media))
+        return instance
+
+
+# Accept multiple possible upload keys for backwards-compatibility
+UPLOAD_KEYS = ('MediaProperty', 'ImagesProperty', 'images', 'media')
+
+# Concurrent storage writes for one request's uploads
+MAX_UPLOAD_WORKERS = 8
+
+
+def uploaded_files(request):
+    if request is None:
+        return []
+    return [f for key in UPLOAD_KEYS for f in request.FILES.getlist(key)]
+
+
+def media_images(media_data):
+    # items may be dicts like {'Images': <file>} or {'Images': <url>}
+    return [m.get('Images') if isinstance(m, dict) else None for m in media_data]
+
+
+def feature_values(features_data):
+    values = [feat.get('features') if isinstance(feat, dict) else feat for feat in features_data]
+    return [value for value in values if value]
+
+
+def store_images(images):
+    """Write uploaded files to storage concurrently.
+
+    Returns (names, written): the stored name for every entry, and the names of
+    the files written by this call. Entries that are not uploads (existing
+    names, URLs, None) are passed through. If any write fails, the files
+    already written are removed again.
+    """
+    field = MediaProperty._meta.get_field('Images')
+    uploads = [(i, f) for i, f in enumerate(images) if hasattr(f, 'read')]
+    if not uploads:
+        return list(images), []
+
+    def save(upload):
+        name = field.generate_filename(None, upload.name)
+        return field.storage.save(name, upload, max_length=field.max_length)
+
+    stored = list(images)
+    with ThreadPoolExecutor(max_workers=min(MAX_UPLOAD_WORKERS, len(uploads))) as executor:
+        futures = [(i, executor.submit(save, f)) for i, f in uploads]
+    errors = []
+    for i, future in futures:
+        try:
+            stored[i] = future.result()
+        except Exception as exc:
+            stored[i] = None
+            errors.append(exc)
+    written = [stored[i] for i, _ in uploads if stored[i]]
+    if errors:
+        delete_stored(written)
+        raise errors[0]
+    return stored, written
+
+
+def delete_stored(names):
+    storage = MediaProperty._meta.get_field('Images').storage
+    for name in names:
+        if isinstance(name, str) and name:
+            try:
+                storage.delete(name)
+            except OSError:
+                pass
+
+
+def write_nested(property_instance, images, feature_names):
+    """bulk_create the gallery and feature rows of a property (no per-row post_save)."""
+    media = MediaProperty.objects.bulk_create(
+        MediaProperty(property=property_instance, Images=name) for name in images
+    )
+    Features.objects.bulk_create(
+        Features(property=property_instance, features=name) for name in feature_names
+    )
+    if media or feature_names:
+        mark_listing_changed(property_instance.pk)
+    return media
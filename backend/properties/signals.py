@@ -0,0 +1,148 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import Features, MediaProperty, Property
+from .market import refresh_groups
+from . import alerts, images, search, tiles
+from .images import needs_variants, schedule_variants
+from .similar import similar_index
+from .cache import invalidate_lists, invalidate_properties, invalidate_property, mark_listing_changed
+
+# Sent by bulk writers (e.g. import_properties) that bypass save(): ids of the new
+# properties and the MediaProperty rows created with them.
+properties_imported = Signal()
+
+# Sent by bulk writers (e.g. geocode_properties) that move existing properties
+# without save(): their ids and the (lng, lat) positions they had before.
+properties_relocated = Signal()
+
+
+@receiver(post_save, sender=Property)
+def index_property_for_search(sender, instance, raw=False, **kwargs):
+    """Keep the FTS5 row of a property in step with its searchable columns."""
+    if raw:
+        return
+    search.index_property(instance)
+
+
+@receiver(post_delete, sender=Property)
+def remove_property_from_search(sender, instance, **kwargs):
+    search.remove_property(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_cached_property(sender, instance, **kwargs):
+    invalidate_property(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def refresh_similarity_row(sender, instance, **kwargs):
+    similar_index.mark_dirty(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+def refresh_market_stats(sender, instance, raw=False, **kwargs):
+    """Recompute the MarketStat groups a listing left and joined, if any input changed."""
+    if raw:
+        return
+    current = tuple(getattr(instance, name) for name in Property.MARKET_FIELDS)
+    previous = getattr(instance, '_market_snapshot', None)
+    if current == previous:
+        return
+    groups = [current[:2]] + ([previous[:2]] if previous else [])
+    refresh_groups(groups)
+    instance._market_snapshot = current
+
+
+@receiver(post_save, sender=Property)
+def alert_saved_searches(sender, instance, created=False, raw=False, **kwargs):
+    """Check saved searches once a listing goes live (created published, or published later)."""
+    if raw or 'is_published' in instance.get_deferred_fields():
+        return
+    # an existing row loaded without is_published (.only()/.defer()) has no snapshot;
+    # its previous state is unknown, so it is not treated as a publish
+    was_published = False if created else getattr(instance, '_was_published', None)
+    published_now = instance.is_published and was_published is False
+    instance._was_published = instance.is_published
+    if published_now:
+        transaction.on_commit(lambda: alerts.notify_published([instance.pk]))
+
+
+def invalidate_tiles(points):
+    # once now and again after commit, so a tile rendered from the old rows in between is dropped too
+    points = [point for point in points if point is not None]
+    tiles.invalidate_points(points)
+    transaction.on_commit(lambda: tiles.invalidate_points(points))
+
+
+@receiver(post_save, sender=Property)
+def invalidate_property_tiles(sender, instance, raw=False, **kwargs):
+    """Drop the cached map tiles holding the listing, at its previous and current position."""
+    if raw:
+        return
+    current = (instance.location.x, instance.location.y) if instance.location else None
+    # save() refreshes _loaded_point only after post_save, so it still holds the old position
+    invalidate_tiles([getattr(instance, '_loaded_point', None), current])
+
+
+@receiver(post_delete, sender=Property)
+def invalidate_deleted_property_tiles(sender, instance, **kwargs):
+    invalidate_tiles([(instance.location.x, instance.location.y) if instance.location else None])
+
+
+@receiver(post_delete, sender=Property)
+def refresh_market_stats_on_delete(sender, instance, **kwargs):
+    refresh_groups([(instance.city, instance.type)])
+
+
+@receiver(post_save, sender=MediaProperty)
+@receiver(post_delete, sender=MediaProperty)
+@receiver(post_save, sender=Features)
+@receiver(post_delete, sender=Features)
+def invalidate_cached_parent_property(sender, instance, **kwargs):
+    if instance.property_id is not None:
+        # media and features are part of the listing, so they move its updated_at
+        # (and with it the ETag / Last-Modified validators) too
+        mark_listing_changed(instance.property_id)
+
+
+@receiver(post_save, sender=MediaProperty)
+def queue_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not needs_variants(instance):
+        return
+    transaction.on_commit(lambda: schedule_variants([instance]))
+
+
+@receiver(post_delete, sender=MediaProperty)
+def delete_unused_image_files(sender, instance, **kwargs):
+    if not instance.Images:
+        return
+    name, variants = instance.Images.name, instance.variants
+    # after commit: a rolled-back delete keeps its files, and a replacement row
+    # re-using the same name (see SerializerProperty.update) keeps them too
+    transaction.on_commit(lambda: images.delete_image_files(name, variants))
+
+
+@receiver(properties_imported)
+def refresh_imported_properties(sender, ids, media=(), **kwargs):
+    search.index_properties(ids)
+    invalidate_lists()
+    for pk in ids:
+        similar_index.mark_dirty(pk)
+    refresh_groups(Property.objects.filter(pk__in=ids).values_list('city', 'type').distinct())
+    invalidate_tiles(list(tiles.listing_points(Property.objects.filter(pk__in=ids))))
+    ids = list(ids)
+    transaction.on_commit(lambda: alerts.notify_published(ids))
+    media = list(media)
+    transaction.on_commit(lambda: schedule_variants(media))
+
+
+@receiver(properties_relocated)
+def refresh_relocated_properties(sender, ids, previous=(), **kwargs):
+    invalidate_properties(ids)
+    for pk in ids:
+        similar_index.mark_dirty(pk)
+    invalidate_tiles([*previous, *tiles.listing_points(Property.objects.filter(pk__in=ids))])
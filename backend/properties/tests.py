@@ -1,17 +1,86 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from io import BytesIO, StringIO
+from PIL import Image
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from accounts.models import Profile
-from properties.models import AgentProfile, Property, Features
-from properties.serializers import SerializerProperty
+from properties.models import (
+	AgentProfile, Property, Features, MediaProperty, VideoUpload, MarketStat, SavedSearch, DuplicateCandidate,
+	PropertyVisit, ImportCheckpoint, DEFAULT_POINT
+)
+from properties.management.commands.import_properties import Command as ImportCommand
+from notifications.models import Notification
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from properties.serializers import SerializerProperty, store_images
+from properties.counters import ViewCounter
+from properties.similar import similar_index
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from rest_framework.test import APIRequestFactory
+from rest_framework.test import APIRequestFactory, APIClient
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from properties.conditional import make_etag
+from properties.uploads import append_chunk, partial_path
+from django.contrib.gis.geos import Point
 from django.utils.datastructures import MultiValueDict
 from types import SimpleNamespace
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.db import DatabaseError, OperationalError, connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from properties import geohash, search, tiles
 
 
-class PropertySerializerTest(TestCase):
+def make_property(owner, at=None, **overrides):
+	"""Create a listing with valid defaults; keyword arguments override any field
+	and at=(lng, lat) places it.
+	"""
+	fields = dict(
+		owner=owner, title='Test property', description='Test listing', price=100, type='House',
+		area=100.0, rooms=3, bedrooms=2, bathrooms=1, city='TestCity'
+	)
+	if at is not None:
+		fields['location'] = Point(*at, srid=4326)
+	fields.update(overrides)
+	return Property.objects.create(**fields)
+
+
+def use_temp_dirs(test, *names):
+	"""Point each named setting at its own temporary directory for one test, removed afterwards."""
+	paths = {name: tempfile.mkdtemp() for name in names}
+	for path in paths.values():
+		test.addCleanup(shutil.rmtree, path, ignore_errors=True)
+	override = override_settings(**paths)
+	override.enable()
+	test.addCleanup(override.disable)
+	return paths
+
+
+class PropertyAPITestCase(TestCase):
+	"""Shared fixture: an empty cache, an agent ``self.user`` and an API client."""
+	username = 'agent'
+
 	def setUp(self):
-		self.user = User.objects.create_user(username='test_agent', password='pass')
+		cache.clear()
+		self.user = User.objects.create_user(username=self.username, password='pass')
+		self.client = APIClient()
+
+
+class PropertySerializerTest(PropertyAPITestCase):
+	username = 'test_agent'
+
+	def setUp(self):
+		super().setUp()
+		# uploads must not land in the tracked media_root/
+		use_temp_dirs(self, 'MEDIA_ROOT')
 		# ensure profile
 		try:
 			_ = self.user.profile
@@ -20,18 +89,7 @@ class PropertySerializerTest(TestCase):
 		AgentProfile.objects.get_or_create(user=self.user, profile=self.user.profile)
 
 	def test_property_serialization_includes_features_and_agent(self):
-		prop = Property.objects.create(
-			owner=self.user,
-			title='Unit Test Property',
-			description='A test property',
-			price=123.45,
-			type='House',
-			area=75.0,
-			rooms=2,
-			bedrooms=1,
-			bathrooms=1,
-			city='TestCity'
-		)
+		prop = make_property(self.user, title='Unit Test Property', price=123.45)
 		Features.objects.create(property=prop, features='Garden')
 
 		serializer = SerializerProperty(prop, context={'request': None})
@@ -45,18 +103,7 @@ class PropertySerializerTest(TestCase):
 		self.assertEqual(data['agent']['username'], 'test_agent')
 
 	def test_property_update_replaces_features_and_updates_fields(self):
-		prop = Property.objects.create(
-			owner=self.user,
-			title='To Update',
-			description='Before update',
-			price=50.00,
-			type='House',
-			area=60.0,
-			rooms=1,
-			bedrooms=1,
-			bathrooms=1,
-			city='OldCity'
-		)
+		prop = make_property(self.user, title='To Update', price=50.00, rooms=1, bedrooms=1, city='OldCity')
 		Features.objects.create(property=prop, features='Garden')
 
 		update_data = {
@@ -112,3 +159,1016 @@ class PropertySerializerTest(TestCase):
 		media = prop.MediaProperty.first()
 		# ensure file name saved (backend storage may vary)
 		self.assertIn('test.jpg', getattr(media.Images, 'name', ''))
+
+	def test_replacing_media_releases_video_uploads(self):
+		prop = make_property(self.user)
+		media = MediaProperty.objects.create(property=prop, Images='property_images/tour.jpg')
+		upload = VideoUpload.objects.create(owner=self.user, property=prop, filename='tour.mp4', size=4, offset=4, media=media)
+
+		serializer = SerializerProperty(prop, data={'MediaProperty': []}, partial=True, context={'request': None})
+		self.assertTrue(serializer.is_valid(), serializer.errors)
+		serializer.save()
+		upload.refresh_from_db()
+		self.assertIsNone(upload.media_id)
+		self.assertFalse(prop.MediaProperty.exists())
+
+		# only files written by the call count as its own, so a rollback never removes existing ones
+		names, written = store_images(['property_images/kept.jpg', SimpleUploadedFile('new.jpg', b'new', content_type='image/jpeg')])
+		self.assertEqual(names[0], 'property_images/kept.jpg')
+		self.assertEqual(written, [names[1]])
+
+	def test_nested_writes_are_batched(self):
+		def create(count):
+			request = SimpleNamespace(user=self.user, FILES=MultiValueDict({
+				'images': [SimpleUploadedFile(f'photo{i}.jpg', b'filecontent', content_type='image/jpeg') for i in range(count)]
+			}), POST=MultiValueDict({'features': [f'Feature {i}' for i in range(count)]}))
+			data = {
+				'title': 'Batched', 'description': 'Many photos', 'price': 10.0, 'type': 'House',
+				'area': 50.0, 'rooms': 1, 'bedrooms': 1, 'bathrooms': 1, 'city': 'BatchCity'
+			}
+			serializer = SerializerProperty(data=data, context={'request': request})
+			self.assertTrue(serializer.is_valid(), serializer.errors)
+			with CaptureQueriesContext(connection) as queries:
+				prop = serializer.save(owner=self.user)
+			return prop, len(queries)
+
+		prop, few = create(2)
+		prop, many = create(20)
+		self.assertEqual(few, many)
+		self.assertEqual(prop.MediaProperty.count(), 20)
+		self.assertEqual(prop.Features_Property.count(), 20)
+
+
+class PropertyGeoSearchTest(PropertyAPITestCase):
+	def result_titles(self, response):
+		self.assertEqual(response.status_code, 200, response.content)
+		return [p['title'] for p in response.json()['results']]
+
+	def test_near_filters_by_radius_and_orders_by_distance(self):
+		make_property(self.user, title='Kariakoo', at=(39.2700, -6.8160))
+		make_property(self.user, title='Masaki', at=(39.2800, -6.7500))
+		make_property(self.user, title='Arusha', at=(36.6830, -3.3869))
+
+		response = self.client.get('/api/properties/', {
+			'near': '-6.8160,39.2700', 'radius_km': 20, 'ordering': 'distance'
+		})
+		self.assertEqual(self.result_titles(response), ['Kariakoo', 'Masaki'])
+
+	def test_bbox_returns_only_contained_properties(self):
+		make_property(self.user, title='Kariakoo', at=(39.2700, -6.8160))
+		make_property(self.user, title='Arusha', at=(36.6830, -3.3869))
+
+		response = self.client.get('/api/properties/', {'bbox': '39.0,-7.0,39.5,-6.5'})
+		self.assertEqual(self.result_titles(response), ['Kariakoo'])
+
+	def test_invalid_geo_parameters_are_rejected(self):
+		self.assertEqual(self.client.get('/api/properties/', {'near': 'nowhere'}).status_code, 400)
+		self.assertEqual(self.client.get('/api/properties/', {'ordering': 'distance'}).status_code, 400)
+
+
+class PropertyKeysetPaginationTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.ids = [make_property(self.user, title=f'Paged {i}', price=100 + i).id for i in range(5)]
+
+	def test_walks_every_row_once_newest_first(self):
+		seen = []
+		response = self.client.get('/api/properties/', {'page_size': 2})
+		while True:
+			self.assertEqual(response.status_code, 200)
+			body = response.json()
+			seen.extend(p['id'] for p in body['results'])
+			if not body['next']:
+				break
+			response = self.client.get(body['next'])
+		self.assertEqual(seen, list(reversed(self.ids)))
+
+	def test_previous_link_returns_prior_page(self):
+		first = self.client.get('/api/properties/', {'page_size': 2}).json()
+		second = self.client.get(first['next']).json()
+		back = self.client.get(second['previous']).json()
+		self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in first['results']])
+
+	def test_invalid_cursor_is_not_found(self):
+		self.assertEqual(self.client.get('/api/properties/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class PropertyListQueryCountTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		for i in range(6):
+			owner = User.objects.create_user(username=f'owner_{i}', password='pass')
+			prop = make_property(owner, title=f'Listing {i}', price=1000 + i)
+			MediaProperty.objects.create(property=prop, Images=f'property_images/{i}.jpg')
+			MediaProperty.objects.create(property=prop, Images=f'property_images/{i}b.jpg')
+			Features.objects.create(property=prop, features='Garden')
+			Features.objects.create(property=prop, features='Pool')
+
+	def count_queries(self, page_size):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get('/api/properties/', {'page_size': page_size})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(len(response.json()['results']), page_size)
+		return len(ctx.captured_queries)
+
+	def test_list_query_count_does_not_grow_with_page_size(self):
+		self.assertEqual(self.count_queries(2), self.count_queries(6))
+
+	def test_list_renders_main_image_and_agent(self):
+		row = self.client.get('/api/properties/', {'page_size': 1}).json()['results'][0]
+		self.assertTrue(row['main_image_url'].endswith('property_images/5.jpg'))
+		self.assertEqual(row['agent']['username'], 'owner_5')
+		self.assertEqual(len(row['MediaProperty']), 2)
+
+
+class PropertyFacetsTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		for title, type_, city, bedrooms, price in (
+			('A', 'House', 'Dar es Salaam', 3, 80_000_000),
+			('B', 'House', 'Dar es Salaam', 6, 600_000_000),
+			('C', 'Apartment', 'Dar es Salaam', 2, 40_000_000),
+			('D', 'House', 'Arusha', 3, 90_000_000),
+		):
+			make_property(self.user, title=title, price=price, type=type_, rooms=bedrooms + 1, bedrooms=bedrooms, city=city)
+
+	def facet(self, body, name):
+		return {item['value']: item['count'] for item in body[name]}
+
+	def test_counts_follow_current_filters(self):
+		body = self.client.get('/api/properties/facets/', {'city': 'Dar es Salaam'}).json()
+		self.assertEqual(body['total'], 3)
+		self.assertEqual(self.facet(body, 'type'), {'House': 2, 'Apartment': 1})
+		self.assertEqual(self.facet(body, 'bedrooms')['5+'], 1)
+		self.assertEqual(self.facet(body, 'price')['50000000-100000000'], 1)
+		self.assertEqual(self.facet(body, 'price')['0-50000000'], 1)
+
+	def test_repeat_request_is_served_from_cache(self):
+		self.client.get('/api/properties/facets/', {'type': 'House'})
+		with self.assertNumQueries(0):
+			body = self.client.get('/api/properties/facets/', {'type': 'House'}).json()
+		self.assertEqual(body['total'], 3)
+
+	def test_counts_follow_the_search_query(self):
+		mansion = Property.objects.get(title='B')
+		mansion.title = 'Sea view mansion'
+		mansion.save()
+		body = self.client.get('/api/properties/facets/', {'q': 'mansion'}).json()
+		self.assertEqual(body['total'], 1)
+		self.assertEqual(self.facet(body, 'bedrooms')['5+'], 1)
+		# a different term is a different cache entry
+		self.assertEqual(self.client.get('/api/properties/facets/', {'q': 'facet'}).json()['total'], 4)
+
+
+class PropertyFullTextSearchTest(PropertyAPITestCase):
+	def search(self, q):
+		response = self.client.get('/api/properties/', {'q': q})
+		self.assertEqual(response.status_code, 200)
+		return [p['title'] for p in response.json()['results']]
+
+	def test_search_matches_prefixes_across_columns(self):
+		make_property(self.user, title='Ocean view villa', description='Close to the beach')
+		make_property(self.user, title='City flat', description='Walk to the market', city='Arusha')
+		self.assertEqual(self.search('ocea'), ['Ocean view villa'])
+		self.assertEqual(self.search('arusha market'), ['City flat'])
+
+	def test_index_follows_updates_and_deletes(self):
+		prop = make_property(self.user, title='Quiet cottage', description='Garden and trees')
+		prop.title = 'Renovated bungalow'
+		prop.save()
+		self.assertEqual(self.search('cottage'), [])
+		self.assertEqual(self.search('bungalow'), ['Renovated bungalow'])
+		prop.delete()
+		self.assertEqual(self.search('bungalow'), [])
+
+	def test_operators_in_user_input_are_treated_as_words(self):
+		make_property(self.user, title='Plain house', description='Nothing special')
+		self.assertEqual(self.search('plain NOT "'), ['Plain house'])
+
+	def test_filters_apply_before_the_result_cap(self):
+		make_property(self.user, title='Arusha house', description='Near the clock tower', city='Arusha')
+		for i in range(3):
+			make_property(self.user, title=f'Town house {i}', description='Near the harbour')
+		with mock.patch('properties.views.MAX_RESULTS', 2):
+			response = self.client.get('/api/properties/', {'q': 'house', 'city': 'Arusha'})
+			self.assertEqual([p['title'] for p in response.json()['results']], ['Arusha house'])
+			self.assertEqual(self.client.get('/api/properties/', {'q': 'house'}).json()['count'], 2)
+
+
+class PropertyResponseCacheTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.prop = make_property(self.user, title='Cached')
+		self.url = f'/api/properties/{self.prop.id}/'
+
+	def test_detail_is_served_from_cache_until_features_change(self):
+		self.client.get(self.url)
+		# the ETag / Last-Modified inputs are cached with the payload too
+		with self.assertNumQueries(0):
+			self.assertEqual(self.client.get(self.url).json()['Features_Property'], [])
+
+		Features.objects.create(property=self.prop, features='Balcony')
+		features = self.client.get(self.url).json()['Features_Property']
+		self.assertEqual([f['features'] for f in features], ['Balcony'])
+
+	def test_first_list_page_is_invalidated_by_property_changes(self):
+		self.client.get('/api/properties/')
+		with self.assertNumQueries(0):
+			self.client.get('/api/properties/')
+
+		self.prop.title = 'Renamed'
+		self.prop.save()
+		titles = [p['title'] for p in self.client.get('/api/properties/').json()['results']]
+		self.assertEqual(titles, ['Renamed'])
+
+
+class ViewCounterTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.props = [make_property(self.user, title=f'Viewed {i}') for i in range(3)]
+
+	def test_views_are_buffered_and_flushed_in_batches(self):
+		counter = ViewCounter(interval=3600)
+		a, b, c = self.props
+		with self.assertNumQueries(0):
+			for pk in (a.pk, a.pk, b.pk, b.pk, c.pk):
+				counter.record(pk)
+
+		# a and b share an increment of 2, so two UPDATEs cover three rows
+		with self.assertNumQueries(2):
+			self.assertEqual(counter.flush(), 3)
+		counts = dict(Property.objects.values_list('pk', 'view_count'))
+		self.assertEqual((counts[a.pk], counts[b.pk], counts[c.pk]), (2, 2, 1))
+		self.assertEqual(counter.flush(), 0)
+
+	def test_failed_flush_requeues_only_unwritten_increments(self):
+		counter = ViewCounter(interval=3600)
+		a, b, c = self.props
+		for pk in (a.pk, a.pk, b.pk, b.pk, c.pk):
+			counter.record(pk)
+
+		update, calls = QuerySet.update, []
+
+		def flaky_update(queryset, **kwargs):
+			calls.append(kwargs)
+			if len(calls) == 2:
+				raise DatabaseError('database is locked')
+			return update(queryset, **kwargs)
+
+		with mock.patch.object(QuerySet, 'update', flaky_update), self.assertLogs('properties.counters', 'ERROR'):
+			self.assertEqual(counter.flush(), 2)
+		self.assertEqual(counter.flush(), 1)
+		counts = dict(Property.objects.values_list('pk', 'view_count'))
+		self.assertEqual((counts[a.pk], counts[b.pk], counts[c.pk]), (2, 2, 1))
+
+
+class PropertyClustersTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		for i, at in enumerate(((39.270, -6.816), (39.275, -6.810), (39.260, -6.820), (36.683, -3.387))):
+			make_property(self.user, title=f'Pin {i}', price=100 * (i + 1), at=at, is_published=True)
+		# neither may show up: a draft, and a listing still at the placeholder point
+		make_property(self.user, title='Draft pin', at=(39.271, -6.815))
+		make_property(self.user, title='Unplaced pin', is_published=True)
+
+	def test_geohash_is_derived_from_location(self):
+		self.assertTrue(Property.objects.get(title='Pin 0').geohash.startswith('kyg'))
+
+	def test_clusters_group_nearby_pins(self):
+		response = self.client.get('/api/properties/clusters/', {'bbox': '29.0,-12.0,41.0,-1.0', 'zoom': 5})
+		self.assertEqual(response.status_code, 200, response.content)
+		clusters = sorted(response.json()['clusters'], key=lambda c: -c['count'])
+		self.assertEqual([c['count'] for c in clusters], [3, 1])
+		self.assertEqual(clusters[0]['geohash'], 'kyg')
+		self.assertEqual(float(clusters[0]['price']['max']), 300.0)
+
+	def test_uncached_tiles_are_aggregated_in_one_query(self):
+		params = {'bbox': '29.0,-12.0,41.0,-1.0', 'zoom': 9}
+		with self.assertNumQueries(1):
+			first = self.client.get('/api/properties/clusters/', params).json()
+		with self.assertNumQueries(0):
+			again = self.client.get('/api/properties/clusters/', params).json()
+		self.assertEqual(sum(c['count'] for c in first['clusters']), 4)
+		self.assertEqual(again, first)
+
+	def test_zoom_is_required(self):
+		response = self.client.get('/api/properties/clusters/', {'bbox': '29.0,-12.0,41.0,-1.0'})
+		self.assertEqual(response.status_code, 400)
+
+
+class PropertySparseFieldsTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.prop = make_property(self.user, title='Card')
+		MediaProperty.objects.create(property=self.prop, Images='property_images/card.jpg')
+		Features.objects.create(property=self.prop, features='Garden')
+		Features.objects.create(property=self.prop, features='Pool')
+
+	def test_card_view_skips_nested_lists(self):
+		# validators plus a single query for the page
+		with self.assertNumQueries(2):
+			row = self.client.get('/api/properties/', {'view': 'card'}).json()['results'][0]
+		self.assertNotIn('description', row)
+		self.assertNotIn('MediaProperty', row)
+		self.assertEqual((row['media_count'], row['feature_count']), (1, 2))
+		self.assertTrue(row['main_image_url'].endswith('property_images/card.jpg'))
+
+	def test_fields_selects_a_sparse_fieldset(self):
+		row = self.client.get('/api/properties/', {'fields': 'id,title,price'}).json()['results'][0]
+		self.assertEqual(set(row), {'id', 'title', 'price'})
+
+
+class PropertyConditionalGetTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.prop = make_property(self.user, title='Tagged', city='EtagCity')
+
+	def test_list_answers_matching_etag_with_304(self):
+		first = self.client.get('/api/properties/', {'city': 'EtagCity'})
+		self.assertIn('ETag', first)
+		self.assertIn('Last-Modified', first)
+
+		again = self.client.get('/api/properties/', {'city': 'EtagCity'}, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(again.status_code, 304)
+		self.assertEqual(again.content, b'')
+
+		Features.objects.create(property=self.prop, features='Garage')
+		changed = self.client.get('/api/properties/', {'city': 'EtagCity'}, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(changed.status_code, 200)
+		self.assertNotEqual(changed['ETag'], first['ETag'])
+
+	def test_detail_honours_if_modified_since(self):
+		url = f'/api/properties/{self.prop.id}/'
+		first = self.client.get(url)
+		again = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+		self.assertEqual(again.status_code, 304)
+
+	def test_cached_list_answers_304_without_queries(self):
+		first = self.client.get('/api/properties/', {'city': 'EtagCity'})
+		with self.assertNumQueries(0):
+			again = self.client.get('/api/properties/', {'city': 'EtagCity'}, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(again.status_code, 304)
+
+	def test_etag_depends_on_the_renderer(self):
+		request = APIRequestFactory().get('/api/properties/')
+		request.accepted_renderer = JSONRenderer()
+		as_json = make_etag(request, 1)
+		request.accepted_renderer = BrowsableAPIRenderer()
+		self.assertNotEqual(make_etag(request, 1), as_json)
+
+
+@override_settings(PROPERTY_IMAGE_WORKERS=0)
+class ImageVariantsTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		use_temp_dirs(self, 'MEDIA_ROOT')
+		self.prop = make_property(self.user, title='Photogenic')
+
+	def test_upload_gets_resized_variants(self):
+		buffer = BytesIO()
+		Image.new('RGB', (4000, 2000), 'blue').save(buffer, 'JPEG')
+		upload = SimpleUploadedFile('camera.jpg', buffer.getvalue(), content_type='image/jpeg')
+		with self.captureOnCommitCallbacks(execute=True):
+			media = MediaProperty.objects.create(property=self.prop, Images=upload)
+
+		media.refresh_from_db()
+		self.assertEqual(media.variants['original'], {'width': 4000, 'height': 2000})
+		self.assertEqual((media.variants['thumbnail']['width'], media.variants['thumbnail']['height']), (320, 160))
+		self.assertTrue(media.variants['webp']['name'].endswith('.webp'))
+
+		data = SerializerProperty(Property.objects.get(pk=self.prop.pk), context={'request': None}).data
+		self.assertTrue(data['main_image_url'].endswith('_medium.jpg'))
+		self.assertEqual(set(data['MediaProperty'][0]['variants']), {'thumbnail', 'medium', 'webp'})
+
+	def test_originals_sharing_a_stem_get_their_own_variants(self):
+		media = []
+		for name, color in (('photo.jpg', 'red'), ('photo.png', 'green')):
+			buffer = BytesIO()
+			Image.new('RGB', (800, 600), color).save(buffer, 'PNG' if name.endswith('png') else 'JPEG')
+			upload = SimpleUploadedFile(name, buffer.getvalue())
+			with self.captureOnCommitCallbacks(execute=True):
+				media.append(MediaProperty.objects.create(property=self.prop, Images=upload))
+		jpeg, png = [MediaProperty.objects.get(pk=item.pk) for item in media]
+		self.assertNotEqual(jpeg.variants['thumbnail']['name'], png.variants['thumbnail']['name'])
+
+		with self.captureOnCommitCallbacks(execute=True):
+			jpeg.delete()
+		self.assertTrue(all(default_storage.exists(png.variants[name]['name']) for name in ('thumbnail', 'medium', 'webp')))
+
+	def test_deleted_image_takes_its_variants_along(self):
+		buffer = BytesIO()
+		Image.new('RGB', (800, 600), 'red').save(buffer, 'JPEG')
+		upload = SimpleUploadedFile('gone.jpg', buffer.getvalue(), content_type='image/jpeg')
+		with self.captureOnCommitCallbacks(execute=True):
+			media = MediaProperty.objects.create(property=self.prop, Images=upload)
+		media.refresh_from_db()
+		files = [media.Images.name] + [media.variants[name]['name'] for name in ('thumbnail', 'medium', 'webp')]
+		self.assertTrue(all(default_storage.exists(name) for name in files))
+
+		# still used by another row: nothing is removed
+		shared = MediaProperty.objects.create(property=self.prop, Images=media.Images.name)
+		with self.captureOnCommitCallbacks(execute=True):
+			media.delete()
+		self.assertTrue(all(default_storage.exists(name) for name in files))
+
+		with self.captureOnCommitCallbacks(execute=True):
+			MediaProperty.objects.filter(pk=shared.pk).update(variants=media.variants)
+			MediaProperty.objects.get(pk=shared.pk).delete()
+		self.assertFalse(any(default_storage.exists(name) for name in files))
+
+
+class ImportPropertiesCommandTest(PropertyAPITestCase):
+	username = 'import_agent'
+
+	def setUp(self):
+		super().setUp()
+		self.dir = tempfile.TemporaryDirectory()
+		self.addCleanup(self.dir.cleanup)
+		self.path = os.path.join(self.dir.name, 'feed.csv')
+		with open(self.path, 'w', newline='', encoding='utf-8') as handle:
+			handle.write('title,description,price,type,area,rooms,bedrooms,bathrooms,city,lat,lng,is_published,features\n')
+			handle.write('Beach villa,Sea view,500000,Villa,250,6,4,3,Dar es Salaam,-6.75,39.28,true,Pool|Garden\n')
+			handle.write('Broken row,No price,,House,80,3,2,1,Arusha,,,false,\n')
+			handle.write('City flat,Central,120000,Apartment,70,3,2,1,Arusha,-3.37,36.68,true,\n')
+
+	def run_import(self, *args):
+		with self.captureOnCommitCallbacks(execute=True):
+			call_command('import_properties', self.path, '--owner', 'import_agent', *args, stdout=StringIO(), stderr=StringIO())
+
+	def test_imports_valid_rows_with_derived_columns(self):
+		self.run_import('--chunk-size', '2')
+
+		self.assertEqual(Property.objects.count(), 2)
+		villa = Property.objects.get(title='Beach villa')
+		self.assertAlmostEqual(villa.location.y, -6.75)
+		self.assertTrue(villa.geohash)
+		self.assertEqual(sorted(villa.Features_Property.values_list('features', flat=True)), ['Garden', 'Pool'])
+		self.assertEqual(list(search.apply_search(Property.objects.all(), 'villa').values_list('pk', flat=True)), [villa.pk])
+
+	def test_rerun_resumes_from_checkpoint(self):
+		self.run_import()
+		self.run_import()
+		self.assertEqual(Property.objects.count(), 2)
+
+		self.run_import('--restart')
+		self.assertEqual(Property.objects.count(), 4)
+
+	def test_checkpoint_commits_with_its_chunk(self):
+		with mock.patch.object(ImportCommand, 'write_checkpoint', side_effect=RuntimeError('crash')):
+			with self.assertRaises(RuntimeError):
+				self.run_import('--chunk-size', '2')
+		# the chunk rolled back with its checkpoint, so a rerun can't duplicate it
+		self.assertFalse(Property.objects.exists())
+		self.assertFalse(ImportCheckpoint.objects.exists())
+
+		self.run_import('--chunk-size', '2')
+		self.assertEqual(ImportCheckpoint.objects.get().rows, 3)
+
+	def test_unknown_owner_is_a_row_error(self):
+		self.path = os.path.join(self.dir.name, 'feed.jsonl')
+		with open(self.path, 'w', encoding='utf-8') as handle:
+			handle.write(json.dumps({'title': 'Ghost flat', 'description': 'x', 'price': 1, 'type': 'House', 'area': 10,
+				'rooms': 1, 'bedrooms': 1, 'bathrooms': 1, 'city': 'Arusha', 'owner': 'ghost'}) + '\n')
+			handle.write(json.dumps({'title': 'Owned flat', 'description': 'x', 'price': 1, 'type': 'House', 'area': 10,
+				'rooms': 1, 'bedrooms': 1, 'bathrooms': 1, 'city': 'Arusha', 'owner': 'import_agent'}) + '\n')
+		stderr = StringIO()
+		call_command('import_properties', self.path, stdout=StringIO(), stderr=stderr)
+
+		self.assertEqual(list(Property.objects.values_list('title', flat=True)), ['Owned flat'])
+		self.assertIn('row 1: Unknown owner "ghost"', stderr.getvalue())
+
+	def test_only_unparsable_lines_are_reported_as_invalid_json(self):
+		self.path = os.path.join(self.dir.name, 'feed.jsonl')
+		with open(self.path, 'w', encoding='utf-8') as handle:
+			handle.write('{"title": "Truncated\n')
+			handle.write(json.dumps({'title': 'Priceless', 'description': 'x', 'price': 'a lot', 'type': 'House', 'area': 10,
+				'rooms': 1, 'bedrooms': 1, 'bathrooms': 1, 'city': 'Arusha', 'lat': 'north', 'lng': 36.68}) + '\n')
+		stderr = StringIO()
+		call_command('import_properties', self.path, '--owner', 'import_agent', stdout=StringIO(), stderr=stderr)
+
+		errors = stderr.getvalue().splitlines()
+		self.assertTrue(errors[0].startswith('row 1: invalid JSON'), errors)
+		self.assertEqual(errors[1], 'row 2: latitude/longitude must be numbers')
+		self.assertFalse(Property.objects.exists())
+
+
+class ChunkedVideoUploadTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		use_temp_dirs(self, 'MEDIA_ROOT', 'PROPERTY_UPLOAD_TEMP_DIR')
+		self.prop = make_property(self.user, title='Walkthrough')
+		self.client.force_authenticate(self.user)
+		self.content = bytes(range(256)) * 1000
+
+	def send(self, url, first, last):
+		return self.client.generic(
+			'PATCH', url, self.content[first:last + 1], content_type='application/offset+octet-stream',
+			HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{len(self.content)}'
+		)
+
+	def test_upload_resumes_and_attaches_video(self):
+		response = self.client.post(
+			f'/api/properties/{self.prop.pk}/videos/uploads/', {'filename': 'tour.mp4', 'size': len(self.content)}, format='json'
+		)
+		self.assertEqual(response.status_code, 201, response.content)
+		url = f'/api/properties/videos/uploads/{response.json()["id"]}/'
+
+		self.assertEqual(self.send(url, 0, 99_999).status_code, 200)
+		# a retried or out-of-order chunk is refused with the offset to resume from
+		response = self.send(url, 50_000, 149_999)
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(response['Upload-Offset'], '100000')
+		self.assertEqual(self.client.head(url)['Upload-Offset'], '100000')
+
+		response = self.send(url, 100_000, len(self.content) - 1)
+		self.assertEqual(response.status_code, 200, response.content)
+		media = MediaProperty.objects.get(pk=response.json()['media'])
+		self.assertEqual(media.property_id, self.prop.pk)
+		with media.videos.open('rb') as handle:
+			self.assertEqual(handle.read(), self.content)
+
+	def test_failed_completion_is_retried(self):
+		upload = VideoUpload.objects.create(owner=self.user, property=self.prop, filename='tour.mp4', size=len(self.content))
+		url = f'/api/properties/videos/uploads/{upload.pk}/'
+		with mock.patch.object(MediaProperty, 'save', side_effect=DatabaseError('disk I/O error')):
+			with self.assertRaises(DatabaseError):
+				self.send(url, 0, len(self.content) - 1)
+		upload.refresh_from_db()
+		self.assertEqual((upload.offset, upload.media_id), (len(self.content), None))
+
+		response = self.client.head(url)
+		self.assertEqual(response['Upload-Offset'], str(len(self.content)))
+		upload.refresh_from_db()
+		with upload.media.videos.open('rb') as handle:
+			self.assertEqual(handle.read(), self.content)
+
+	def test_abandoned_uploads_expire(self):
+		stale = VideoUpload.objects.create(owner=self.user, property=self.prop, filename='old.mp4', size=10)
+		fresh = VideoUpload.objects.create(owner=self.user, property=self.prop, filename='new.mp4', size=10)
+		for upload in (stale, fresh):
+			append_chunk(upload, BytesIO(b'12345'), 0, 5)
+		VideoUpload.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(days=2))
+
+		call_command('expire_video_uploads', stdout=StringIO())
+		self.assertEqual(list(VideoUpload.objects.values_list('pk', flat=True)), [fresh.pk])
+		self.assertFalse(os.path.exists(partial_path(stale)))
+		self.assertTrue(os.path.exists(partial_path(fresh)))
+
+	def test_rejects_other_users_and_bad_extensions(self):
+		other = APIClient()
+		other.force_authenticate(User.objects.create_user(username='not_owner', password='pass'))
+		url = f'/api/properties/{self.prop.pk}/videos/uploads/'
+		self.assertEqual(other.post(url, {'filename': 'tour.mp4', 'size': 10}, format='json').status_code, 403)
+		self.assertEqual(self.client.post(url, {'filename': 'tour.exe', 'size': 10}, format='json').status_code, 400)
+		self.assertFalse(VideoUpload.objects.exists())
+
+
+class PropertyIndexUsageTest(TestCase):
+	"""Guards the Meta.indexes on Property against query changes that bring back table scans."""
+
+	def assertUsesIndex(self, queryset, index_name):
+		plan = queryset.explain()
+		self.assertIn(index_name, plan, plan)
+
+	def test_published_feed_uses_index(self):
+		self.assertUsesIndex(
+			Property.objects.filter(is_published=True).order_by('-created_at', '-id'), 'prop_pub_created_idx'
+		)
+
+	def test_status_feed_uses_index(self):
+		self.assertUsesIndex(
+			Property.objects.filter(status='active').order_by('-created_at', '-id'), 'prop_status_created_idx'
+		)
+
+	def test_city_type_price_range_uses_index(self):
+		queryset = Property.objects.filter(city='Arusha', type='House', price__gte=1000, price__lte=5000)
+		self.assertUsesIndex(queryset, 'prop_city_type_price_idx')
+
+	def test_type_price_range_uses_index(self):
+		self.assertUsesIndex(Property.objects.filter(type='Villa', price__lte=5000), 'prop_type_price_idx')
+
+
+class PropertyFeaturedTest(PropertyAPITestCase):
+	def titles(self):
+		response = self.client.get('/api/properties/featured/')
+		self.assertEqual(response.status_code, 200, response.content)
+		return [p['title'] for p in response.json()['results']]
+
+	def test_ranks_current_featured_listings_and_serves_from_cache(self):
+		now = timezone.now()
+		make_property(self.user, title='Popular', is_published=True, featured_until=now + timedelta(days=3), view_count=50)
+		make_property(self.user, title='Paid', is_published=True, featured_until=now + timedelta(days=1), is_paid=True)
+		make_property(self.user, title='Expired', is_published=True, featured_until=now - timedelta(days=1), view_count=500)
+		make_property(self.user, title='Not featured', is_published=True, view_count=500)
+		make_property(self.user, title='Draft', featured_until=now + timedelta(days=3))
+
+		self.assertEqual(self.titles(), ['Paid', 'Popular'])
+		with CaptureQueriesContext(connection) as queries:
+			self.assertEqual(self.titles(), ['Paid', 'Popular'])
+		self.assertEqual(len(queries), 0)
+
+		# a listing entering its feature window is saved, which retires the cached ranking
+		make_property(self.user, title='Fresh', is_published=True, featured_until=now + timedelta(days=2), view_count=80)
+		self.assertEqual(self.titles(), ['Paid', 'Fresh', 'Popular'])
+
+
+class PropertySimilarTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		similar_index.reset()
+		self.addCleanup(similar_index.reset)
+
+	def titles(self, prop, **params):
+		response = self.client.get(f'/api/properties/{prop.pk}/similar/', params)
+		self.assertEqual(response.status_code, 200, response.content)
+		return [p['title'] for p in response.json()['results']]
+
+	def test_orders_published_neighbours_by_similarity(self):
+		target = make_property(self.user, title='Target', price=200_000_000, at=(39.27, -6.81), is_published=True)
+		make_property(self.user, title='Twin', price=210_000_000, at=(39.28, -6.80), is_published=True)
+		make_property(self.user, title='Far away', price=200_000_000, at=(36.68, -3.37), is_published=True)
+		make_property(self.user, title='Mansion', price=2_000_000_000, area=400.0, rooms=10, bedrooms=8, at=(39.27, -6.81), is_published=True)
+		make_property(self.user, title='Office twin', price=200_000_000, at=(39.27, -6.81), type='Office', is_published=True)
+		make_property(self.user, title='Draft twin', price=200_000_000, at=(39.27, -6.81))
+
+		self.assertEqual(self.titles(target, k=2), ['Twin', 'Office twin'])
+		self.assertNotIn('Draft twin', self.titles(target))
+
+	def test_index_follows_listing_changes(self):
+		target = make_property(self.user, title='Target', price=200_000_000, at=(39.27, -6.81), is_published=True)
+		twin = make_property(self.user, title='Twin', price=210_000_000, at=(39.28, -6.80), is_published=True)
+		self.assertEqual(self.titles(target), ['Twin'])
+
+		twin.is_published = False
+		twin.save()
+		self.assertEqual(self.titles(target), [])
+		make_property(self.user, title='Newcomer', price=200_000_000, at=(39.27, -6.81), is_published=True)
+		self.assertEqual(self.titles(target), ['Newcomer'])
+
+	def test_unplaced_listings_are_not_neighbours_of_placed_ones(self):
+		target = make_property(self.user, title='Target', price=300_000_000, at=(39.27, -6.81), is_published=True)
+		unplaced = make_property(self.user, title='Nowhere', price=200_000_000, is_published=True)
+		make_property(self.user, title='Nowhere twin', price=200_000_000, is_published=True)
+		self.assertEqual(self.titles(target), [])
+		# an unplaced listing is compared on everything but location
+		self.assertEqual(self.titles(unplaced), ['Nowhere twin', 'Target'])
+
+	def test_rows_deleted_elsewhere_are_skipped(self):
+		target = make_property(self.user, title='Target', price=200_000_000, at=(39.27, -6.81), is_published=True)
+		twin = make_property(self.user, title='Twin', price=210_000_000, at=(39.28, -6.80), is_published=True)
+		make_property(self.user, title='Cousin', price=250_000_000, at=(39.30, -6.78), is_published=True)
+		self.assertEqual(self.titles(target, k=1), ['Twin'])
+
+		# as if another process deleted it: no signal reaches this index
+		Property.objects.filter(pk=twin.pk)._raw_delete('default')
+		cache.clear()
+		self.assertEqual(self.titles(target, k=1), ['Cousin'])
+
+	def test_unpublished_property_is_not_found(self):
+		draft = make_property(self.user, title='Draft', price=200_000_000, at=(39.27, -6.81))
+		self.assertEqual(self.client.get(f'/api/properties/{draft.pk}/similar/').status_code, 404)
+
+
+class MarketStatTest(PropertyAPITestCase):
+	def stat(self, city='Arusha', type='House'):
+		return MarketStat.objects.filter(city=city, type=type).first()
+
+	def test_groups_follow_listing_changes(self):
+		make_property(self.user, price=100_000, area=100, city='Arusha')
+		make_property(self.user, price=300_000, area=100, city='Arusha')
+		flat = make_property(self.user, price=500_000, area=100, city='Arusha')
+
+		stat = self.stat()
+		self.assertEqual((stat.count, stat.p25, stat.median, stat.p75), (3, 2000, 3000, 4000))
+
+		# moving a listing updates both the group it left and the one it joined
+		flat.city = 'Dodoma'
+		flat.save()
+		self.assertEqual((self.stat().count, self.stat().median), (2, 2000))
+		self.assertEqual(self.stat(city='Dodoma').median, 5000)
+
+		flat.status = 'inactive'
+		flat.save()
+		self.assertIsNone(self.stat(city='Dodoma'))
+
+	def test_endpoint_filters_by_city_and_type(self):
+		make_property(self.user, price=100_000, area=50, city='Arusha')
+		make_property(self.user, price=100_000, area=50, city='Arusha', type='Land')
+		make_property(self.user, price=100_000, area=50, city='Mwanza')
+
+		response = self.client.get('/api/properties/market-stats/', {'city': 'Arusha'})
+		self.assertEqual(response.status_code, 200, response.content)
+		self.assertEqual([(s['city'], s['type']) for s in response.json()], [('Arusha', 'House'), ('Arusha', 'Land')])
+
+	def test_full_refresh_matches_incremental_rows(self):
+		make_property(self.user, price=100_000, area=50, city='Arusha')
+		make_property(self.user, price=400_000, area=80, city='Mwanza')
+		before = list(MarketStat.objects.values_list('city', 'type', 'count', 'median'))
+		call_command('refresh_market_stats', stdout=StringIO())
+		self.assertEqual(list(MarketStat.objects.values_list('city', 'type', 'count', 'median')), before)
+
+
+class SavedSearchAlertTest(TestCase):
+	def setUp(self):
+		self.agent = User.objects.create_user(username='alert_agent', password='pass')
+		self.buyer = User.objects.create_user(username='alert_buyer', password='pass')
+		self.other = User.objects.create_user(username='alert_other', password='pass')
+
+	def publish(self, **extra):
+		fields = dict(
+			title='Alert house', price=150_000_000, bedrooms=3, city='Arusha', is_published=True, at=(36.68, -3.37)
+		)
+		fields.update(extra)
+		with self.captureOnCommitCallbacks(execute=True):
+			return make_property(self.agent, **fields)
+
+	def test_matching_searches_are_notified_once_per_user(self):
+		SavedSearch.objects.create(user=self.buyer, name='Arusha houses', city='arusha', type='House', max_price=200_000_000)
+		SavedSearch.objects.create(user=self.buyer, name='Anything near town', latitude=-3.38, longitude=36.69, radius_km=5)
+		SavedSearch.objects.create(user=self.other, name='Too cheap', city='Arusha', max_price=100_000_000)
+		SavedSearch.objects.create(user=self.other, name='Too far', latitude=-6.8, longitude=39.28, radius_km=20)
+		SavedSearch.objects.create(user=self.other, name='Paused', city='Arusha', is_active=False)
+
+		layer = get_channel_layer()
+		async_to_sync(layer.group_add)(f'notifications_{self.buyer.id}', 'buyer-socket')
+		prop = self.publish()
+
+		notifications = Notification.objects.filter(type='saved_search_match')
+		self.assertEqual([(n.user_id, n.data['property_id']) for n in notifications], [(self.buyer.id, prop.pk)])
+		message = async_to_sync(layer.receive)('buyer-socket')
+		self.assertEqual(message['type'], 'notification.message')
+		self.assertEqual(len(message['message']['notifications']), 1)
+
+	def test_alert_fires_when_a_draft_is_published(self):
+		SavedSearch.objects.create(user=self.buyer, name='Arusha', city='Arusha')
+		prop = self.publish(is_published=False)
+		self.assertFalse(Notification.objects.exists())
+
+		prop.is_published = True
+		with self.captureOnCommitCallbacks(execute=True):
+			prop.save()
+		prop.title = 'Edited'
+		with self.captureOnCommitCallbacks(execute=True):
+			prop.save()
+		self.assertEqual(Notification.objects.count(), 1)
+
+	def test_saving_a_partially_loaded_listing_is_not_a_publish(self):
+		SavedSearch.objects.create(user=self.buyer, name='Arusha', city='Arusha')
+		prop = self.publish()
+		self.assertEqual(Notification.objects.count(), 1)
+
+		for partial in (Property.objects.only('title').get(pk=prop.pk), Property.objects.defer('is_published').get(pk=prop.pk)):
+			partial.title = 'Edited'
+			with self.captureOnCommitCallbacks(execute=True):
+				partial.save()
+		self.assertEqual(Notification.objects.count(), 1)
+
+	def test_api_is_scoped_to_the_user(self):
+		client = APIClient()
+		client.force_authenticate(self.buyer)
+		response = client.post('/api/properties/saved-searches/', {'name': 'Near', 'latitude': -3.4, 'radius_km': 5}, format='json')
+		self.assertEqual(response.status_code, 400)
+		response = client.post('/api/properties/saved-searches/', {'name': 'Dodoma', 'city': 'Dodoma'}, format='json')
+		self.assertEqual(response.status_code, 201, response.content)
+		SavedSearch.objects.create(user=self.other, name='Not mine')
+		self.assertEqual([s['name'] for s in client.get('/api/properties/saved-searches/').json()['results']], ['Dodoma'])
+
+
+class DuplicateDetectionTest(PropertyAPITestCase):
+	def test_reposts_are_queued_for_review(self):
+		njiro = dict(
+			title='3 bedroom house for sale in Njiro', price=150_000_000, city='Arusha', at=(36.6830, -3.3700),
+			description='Spacious family house in Njiro with a large garden, borehole water, solar power and parking for three cars.'
+		)
+		original = make_property(self.user, **njiro)
+		repost = make_property(self.user, **dict(njiro, title='3 bedroom house for sale, Njiro!!', price=155_000_000, at=(36.6831, -3.3700)))
+		make_property(self.user, **dict(njiro, at=(39.28, -6.8)))
+		make_property(self.user, **dict(njiro, price=300_000_000))
+		make_property(self.user, **dict(njiro, type='Villa'))
+		# never geocoded: both sit on the placeholder point, which says nothing about where they are
+		for _ in range(2):
+			make_property(self.user, title='Plot for sale in Kigamboni', description='Surveyed plot with title deed near the ferry.')
+
+		call_command('find_duplicate_properties', stdout=StringIO())
+		self.assertEqual(
+			list(DuplicateCandidate.objects.values_list('original_id', 'property_id', 'status')),
+			[(original.pk, repost.pk, 'pending')]
+		)
+
+		# re-runs leave reviewed pairs alone
+		DuplicateCandidate.objects.update(status='dismissed')
+		call_command('find_duplicate_properties', stdout=StringIO())
+		self.assertEqual(list(DuplicateCandidate.objects.values_list('status', flat=True)), ['dismissed'])
+
+
+@override_settings(PROPERTY_VISIT_DURATION_MINUTES=30, PROPERTY_VISIT_DAY_START=9, PROPERTY_VISIT_DAY_END=11)
+class VisitSchedulingTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.visitor = User.objects.create_user(username='visit_buyer', password='pass')
+		self.prop = make_property(self.user, title='Viewing')
+		self.client.force_authenticate(self.visitor)
+		self.day = date.today() + timedelta(days=2)
+
+	def at(self, hour, minute=0):
+		return datetime(self.day.year, self.day.month, self.day.day, hour, minute, tzinfo=dt_timezone.utc)
+
+	def book(self, when):
+		return self.client.post('/api/properties/visits/', {
+			'property': self.prop.pk, 'visitor': self.visitor.pk, 'scheduled_time': when.isoformat()
+		}, format='json')
+
+	def test_overlapping_bookings_are_rejected(self):
+		self.assertEqual(self.book(self.at(9)).status_code, 201)
+		self.assertEqual(self.book(self.at(9, 15)).status_code, 400)
+		self.assertEqual(self.book(self.at(9, 30)).status_code, 201)
+
+		PropertyVisit.objects.filter(scheduled_time=self.at(9)).update(status='cancelled')
+		self.assertEqual(self.book(self.at(9, 10)).status_code, 201)
+
+	def test_booking_that_cannot_take_the_lock_is_refused(self):
+		# a concurrent booking holding SQLite's write lock past the timeout
+		with mock.patch.object(QuerySet, 'update', side_effect=OperationalError('database is locked')):
+			response = self.book(self.at(11))
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('scheduled_time', response.json())
+		self.assertFalse(PropertyVisit.objects.exists())
+
+	def test_availability_lists_open_slots(self):
+		PropertyVisit.objects.create(property=self.prop, visitor=self.visitor, scheduled_time=self.at(9, 45))
+		PropertyVisit.objects.create(property=self.prop, visitor=self.visitor, scheduled_time=self.at(10, 30), status='cancelled')
+
+		response = self.client.get(
+			f'/api/properties/{self.prop.pk}/availability/', {'from': self.day.isoformat(), 'to': self.day.isoformat()}
+		)
+		self.assertEqual(response.status_code, 200, response.content)
+		self.assertEqual(response.json()['slots'], [self.at(9).isoformat(), self.at(10, 30).isoformat()])
+
+
+class VisitCalendarTest(TestCase):
+	def setUp(self):
+		self.agent = User.objects.create_user(username='calendar_agent', password='pass')
+		self.buyer = User.objects.create_user(username='calendar_buyer', password='pass')
+		self.stranger = User.objects.create_user(username='calendar_stranger', password='pass')
+		self.own = make_property(self.agent, title='calendar_agent home')
+		self.other = make_property(self.stranger, title='calendar_stranger home')
+		self.start = datetime(2030, 5, 6, 9, tzinfo=dt_timezone.utc)
+		for day in range(5):
+			PropertyVisit.objects.create(property=self.own, visitor=self.buyer, scheduled_time=self.start + timedelta(days=day))
+		PropertyVisit.objects.create(property=self.other, visitor=self.stranger, scheduled_time=self.start)
+		PropertyVisit.objects.create(property=self.other, visitor=self.agent, scheduled_time=self.start + timedelta(hours=3))
+
+	def calendar(self, user, **params):
+		client = APIClient()
+		client.force_authenticate(user)
+		with CaptureQueriesContext(connection) as queries:
+			response = client.get('/api/properties/visits/', params)
+		self.assertEqual(response.status_code, 200, response.content)
+		return response.json()['results'], len(queries)
+
+	def test_visits_are_scoped_to_visitor_and_owner(self):
+		visits, _ = self.calendar(self.agent)
+		# five visits to the agent's listing plus the one they booked elsewhere
+		self.assertEqual(len(visits), 6)
+		visits, _ = self.calendar(self.buyer)
+		self.assertEqual({v['property_title'] for v in visits}, {'calendar_agent home'})
+		visits, _ = self.calendar(self.stranger)
+		self.assertEqual(len(visits), 2)
+
+	def test_range_filter_and_constant_queries(self):
+		visits, few = self.calendar(self.agent, **{'from': '2030-05-07', 'to': '2030-05-08'})
+		self.assertEqual([v['scheduled_time'][:10] for v in visits], ['2030-05-07', '2030-05-08'])
+
+		for day in range(5, 30):
+			PropertyVisit.objects.create(property=self.own, visitor=self.buyer, scheduled_time=self.start + timedelta(days=day))
+		_, many = self.calendar(self.agent)
+		self.assertEqual(few, many)
+
+		client = APIClient()
+		client.force_authenticate(self.agent)
+		self.assertEqual(client.get('/api/properties/visits/', {'from': 'tomorrow'}).status_code, 400)
+		other_visit = PropertyVisit.objects.get(visitor=self.stranger)
+		self.assertEqual(client.get(f'/api/properties/visits/{other_visit.pk}/').status_code, 404)
+
+
+class PropertyExportAndTilesTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		use_temp_dirs(self, 'PROPERTY_TILE_CACHE_DIR')
+
+	def test_geojson_export_streams_published_listings(self):
+		listed = make_property(self.user, title='Listed', at=(39.28, -6.80), is_published=True)
+		make_property(self.user, title='Draft', at=(39.27, -6.81))
+
+		response = self.client.get('/api/properties/export.geojson')
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.streaming)
+		self.assertEqual(response['Content-Type'], 'application/geo+json')
+		collection = json.loads(b''.join(response.streaming_content))
+		self.assertEqual(collection['type'], 'FeatureCollection')
+		[feature] = collection['features']
+		self.assertEqual(feature['id'], listed.pk)
+		self.assertEqual(feature['properties']['title'], 'Listed')
+		self.assertAlmostEqual(feature['geometry']['coordinates'][0], 39.28)
+		self.assertAlmostEqual(feature['geometry']['coordinates'][1], -6.80)
+
+	def test_tile_is_cached_and_invalidated_when_listing_changes(self):
+		prop = make_property(self.user, title='Harbour view', at=(39.28, -6.80), is_published=True)
+		z, x, y = tiles.tile_of(39.28, -6.80, 12)
+		url = f'/api/properties/tiles/{z}/{x}/{y}.mvt'
+
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+		self.assertIn(b'properties', response.content)
+		self.assertIn(b'Harbour view', response.content)
+		self.assertTrue(os.path.exists(tiles.tile_path(z, x, y)))
+
+		# moving the listing away drops the tile it left, so the next render omits it
+		prop = Property.objects.get(pk=prop.pk)
+		prop.location = Point(36.68, -3.37, srid=4326)
+		prop.save()
+		self.assertFalse(os.path.exists(tiles.tile_path(z, x, y)))
+		self.assertNotIn(b'Harbour view', self.client.get(url).content)
+
+		z, x, y = tiles.tile_of(36.68, -3.37, 12)
+		self.assertIn(b'Harbour view', self.client.get(f'/api/properties/tiles/{z}/{x}/{y}.mvt').content)
+
+	def test_unplaced_listings_have_no_position(self):
+		make_property(self.user, title='Somewhere', is_published=True)
+		[feature] = json.loads(b''.join(self.client.get('/api/properties/export.geojson').streaming_content))['features']
+		self.assertIsNone(feature['geometry'])
+
+		z, x, y = tiles.tile_of(*DEFAULT_POINT, 12)
+		self.assertNotIn(b'Somewhere', self.client.get(f'/api/properties/tiles/{z}/{x}/{y}.mvt').content)
+
+	def test_tile_outside_the_grid_is_not_found(self):
+		self.assertEqual(self.client.get('/api/properties/tiles/2/4/0.mvt').status_code, 404)
+
+
+class GeocodePropertiesTest(PropertyAPITestCase):
+	def setUp(self):
+		super().setUp()
+		handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+		handle.write(
+			'name,latitude,longitude,alternate_names,population\n'
+			'Dar es Salaam,-6.8235,39.2695,Dar|DSM,4364541\n'
+			'Masaki,-6.7470,39.2840,,50000\n'
+			'Arusha,-3.3869,36.6830,,416442\n'
+		)
+		handle.close()
+		self.addCleanup(os.remove, handle.name)
+		self.gazetteer = handle.name
+
+	def assertCoordinates(self, prop, lat, lng):
+		prop.refresh_from_db()
+		self.assertAlmostEqual(prop.location.y, lat, places=6)
+		self.assertAlmostEqual(prop.location.x, lng, places=6)
+		self.assertAlmostEqual(float(prop.latitude), lat, places=6)
+		self.assertAlmostEqual(float(prop.longitude), lng, places=6)
+
+	def test_save_keeps_location_and_coordinates_consistent(self):
+		prop = make_property(self.user, title='Typed coordinates', city='Dar es Salaam', latitude=Decimal('-6.8'), longitude=Decimal('39.28'))
+		self.assertCoordinates(prop, -6.8, 39.28)
+		self.assertEqual(prop.get_lat_lng(), (prop.location.y, prop.location.x))
+
+		prop.location = Point(36.68, -3.37, srid=4326)
+		prop.save()
+		self.assertCoordinates(prop, -3.37, 36.68)
+
+		prop.latitude, prop.longitude = Decimal('-6.75'), Decimal('39.3')
+		prop.save(update_fields=['latitude', 'longitude'])
+		self.assertCoordinates(prop, -6.75, 39.3)
+
+		placeholder = make_property(self.user, title='No coordinates', city='Atlantis')
+		self.assertIsNone(placeholder.latitude)
+		self.assertIsNone(placeholder.longitude)
+
+	def test_backfill_geocodes_from_coordinates_address_and_city(self):
+		by_address = make_property(self.user, title='Masaki flat', city='Dar es Salaam', adress='Plot 4, Masaki')
+		by_city = make_property(self.user, title='Arusha house', city='arusha')
+		far_address = make_property(self.user, title='Namesake street', city='Arusha', adress='Masaki')
+		unknown = make_property(self.user, title='Lost city', city='Atlantis')
+		typed = make_property(self.user, title='Typed only', city='Dar es Salaam')
+		# legacy rows kept latitude/longitude apart from the placeholder location
+		Property.objects.filter(pk=typed.pk).update(latitude=Decimal('-6.9'), longitude=Decimal('39.1'))
+
+		out = StringIO()
+		with CaptureQueriesContext(connection) as queries:
+			call_command('geocode_properties', gazetteer=self.gazetteer, batch_size=2, stdout=out)
+		self.assertIn('Updated 4 listings', out.getvalue())
+		self.assertIn('1 could not be placed', out.getvalue())
+		# three batches of two rows, one bulk UPDATE per batch with changes, no per-row saves
+		self.assertEqual(sum('UPDATE' in q['sql'] for q in queries.captured_queries), 3)
+
+		self.assertCoordinates(by_address, -6.7470, 39.2840)
+		self.assertCoordinates(by_city, -3.3869, 36.6830)
+		self.assertCoordinates(far_address, -3.3869, 36.6830)
+		self.assertCoordinates(typed, -6.9, 39.1)
+		unknown.refresh_from_db()
+		self.assertIsNone(unknown.latitude)
+		self.assertEqual(by_city.geohash, geohash.encode(-3.3869, 36.6830))
+
+		out = StringIO()
+		call_command('geocode_properties', gazetteer=self.gazetteer, stdout=out)
+		self.assertIn('Updated 0 listings', out.getvalue())
@@ -0,0 +1,192 @@
+"""Mapbox vector tiles (MVT 2.1) of published listings, cached on disk.
+
+Tiles use the usual XYZ Web Mercator scheme. Each tile has a single
+``properties`` layer with one point feature per listing, carrying
+id/title/price/type/city as attributes. The protobuf is written by hand below;
+it only needs the handful of message types a point layer uses.
+
+Rendered tiles are stored as PROPERTY_TILE_CACHE_DIR/z/x/y.mvt. When a listing
+is saved or deleted, signals.py removes the tile containing its old and new
+position at every zoom level, so only the tiles that changed are re-rendered.
+The cache is per host; several web hosts need a shared directory.
+"""
+import math
+import os
+import struct
+import tempfile
+
+from django.conf import settings
+from django.db.models import FloatField, Func
+
+from .filters import in_spatial_index
+
+LAYER_NAME = 'properties'
+EXTENT = 4096
+MAX_ZOOM = 20
+MAX_TILE_FEATURES = 10000
+
+# Web Mercator stops short of the poles
+MAX_LATITUDE = 85.0511287798
+
+ATTRIBUTES = ('title', 'price', 'type', 'city')
+
+
+# --- protobuf --------------------------------------------------------------
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type, payload):
+    key = _varint((number << 3) | wire_type)
+    if wire_type == 0:
+        return key + _varint(payload)
+    if wire_type == 1:
+        return key + payload
+    return key + _varint(len(payload)) + payload
+
+
+def _packed(number, values):
+    return _field(number, 2, b''.join(_varint(v) for v in values))
+
+
+def _value(value):
+    """Encode a Tile.Value: strings, doubles or signed integers."""
+    if isinstance(value, bool):
+        return _field(7, 0, int(value))
+    if isinstance(value, int):
+        return _field(6, 0, _zigzag(value))
+    if isinstance(value, float):
+        return _field(3, 1, struct.pack('<d', value))
+    return _field(1, 2, str(value).encode('utf-8'))
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """Encode one point layer; features are (id, x, y, {attribute: value}) in tile coordinates."""
+    keys, key_index, values, value_index = [], {}, [], {}
+    encoded = []
+    for feature_id, x, y, attributes in features:
+        tags = []
+        for key, value in attributes.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            token = (type(value).__name__, value)
+            if token not in value_index:
+                value_index[token] = len(values)
+                values.append(value)
+            tags += (key_index[key], value_index[token])
+        # MoveTo(1) with a single zigzag-encoded point
+        geometry = (1 << 3) | 1, _zigzag(x), _zigzag(y)
+        body = _field(1, 0, feature_id) + _packed(2, tags) + _field(3, 0, 1) + _packed(4, geometry)
+        encoded.append(_field(2, 2, body))
+
+    layer = _field(15, 0, 2) + _field(1, 2, name.encode('utf-8')) + b''.join(encoded)
+    layer += b''.join(_field(3, 2, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_field(4, 2, _value(value)) for value in values)
+    layer += _field(5, 0, extent)
+    return _field(3, 2, layer)
+
+
+# --- tile geometry ---------------------------------------------------------
+
+def tile_bbox(z, x, y):
+    """(min_lng, min_lat, max_lng, max_lat) of an XYZ tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y))
+
+
+def tile_position(lng, lat, z):
+    """Fractional tile coordinates of a point at zoom z."""
+    n = 2 ** z
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = (lng + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return min(x, n - 1e-9), min(y, n - 1e-9)
+
+
+def tile_of(lng, lat, z):
+    x, y = tile_position(lng, lat, z)
+    return z, int(x), int(y)
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+# --- rendering and cache ---------------------------------------------------
+
+def render_tile(queryset, z, x, y):
+    rows = (
+        # listings at the DEFAULT_LOCATION placeholder have no real position to draw
+        in_spatial_index(queryset.placed(), tile_bbox(z, x, y))
+        .annotate(
+            lng=Func('location', function='ST_X', output_field=FloatField()),
+            lat=Func('location', function='ST_Y', output_field=FloatField()),
+        )
+        .order_by('id')
+        .values_list('id', 'lng', 'lat', *ATTRIBUTES)[:MAX_TILE_FEATURES]
+    )
+    features = []
+    for pk, lng, lat, title, price, type, city in rows:
+        px, py = tile_position(lng, lat, z)
+        tx = min(max(int((px - x) * EXTENT), 0), EXTENT - 1)
+        ty = min(max(int((py - y) * EXTENT), 0), EXTENT - 1)
+        features.append((pk, tx, ty, {'id': pk, 'title': title, 'price': float(price), 'type': type, 'city': city}))
+    return encode_layer(LAYER_NAME, features)
+
+
+def tile_path(z, x, y):
+    return os.path.join(settings.PROPERTY_TILE_CACHE_DIR, str(z), str(x), f'{y}.mvt')
+
+
+def get_tile(queryset, z, x, y):
+    """Return the encoded tile, rendering and storing it on a cache miss."""
+    path = tile_path(z, x, y)
+    try:
+        with open(path, 'rb') as handle:
+            return handle.read()
+    except FileNotFoundError:
+        pass
+    data = render_tile(queryset, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+    return data
+
+
+def invalidate_points(points):
+    """Drop the cached tiles containing any of the (lng, lat) points, at every zoom level."""
+    keys = {tile_of(lng, lat, z) for lng, lat in set(points) for z in range(MAX_ZOOM + 1)}
+    for key in keys:
+        try:
+            os.remove(tile_path(*key))
+        except FileNotFoundError:
+            pass
+
+
+def listing_points(queryset):
+    return queryset.annotate(
+        lng=Func('location', function='ST_X', output_field=FloatField()),
+        lat=Func('location', function='ST_Y', output_field=FloatField()),
+    ).exclude(location__isnull=True).values_list('lng', 'lat')
@@ -0,0 +1,194 @@
+"""Resumable, chunked uploads of property videos.
+
+The protocol is a small subset of tus:
+
+1. ``POST /api/properties/<id>/videos/uploads/`` with ``{"filename", "size"}``
+   opens a VideoUpload session.
+2. ``PATCH /api/properties/videos/uploads/<uuid>/`` sends raw bytes with a
+   ``Content-Range: bytes <first>-<last>/<size>`` header. ``first`` must equal
+   the current offset, otherwise the server answers 409 with the offset it has.
+3. ``HEAD`` / ``GET`` on the same URL report the offset (``Upload-Offset``), so
+   a client that lost its connection resumes from there.
+
+The body is copied from the request stream in CHUNK_SIZE pieces, so memory use
+per request does not depend on the chunk or file size. Bytes that arrived before
+a connection dropped are kept. While a chunk is written the partial file is
+locked, so concurrent PATCHes of one upload are answered 409 instead of
+interleaving. When the last byte is in, the partial file is moved into storage
+and attached to a new MediaProperty; if that fails, a later HEAD, GET or empty
+PATCH retries it.
+
+Sessions idle for PROPERTY_UPLOAD_EXPIRY_HOURS are removed, with their partial
+files, by ``manage.py expire_video_uploads``.
+"""
+import datetime
+import fcntl
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import MediaProperty, VideoUpload
+
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadConflict(Exception):
+    """The chunk does not start at the offset the server has."""
+
+    def __init__(self, offset):
+        super().__init__(f'expected a chunk starting at byte {offset}')
+        self.offset = offset
+
+
+class PartialFile(File):
+    # lets FileSystemStorage move the assembled file instead of copying it
+    def temporary_file_path(self):
+        return self.name
+
+
+def partial_path(upload):
+    return os.path.join(settings.PROPERTY_UPLOAD_TEMP_DIR, f'{upload.pk}.part')
+
+
+def parse_content_range(header, size):
+    """Return (start, length) of a 'bytes first-last/size' header."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise ValidationError({'Content-Range': "Expected 'bytes <first>-<last>/<size>'."})
+    first, last, total = (int(part) for part in match.groups())
+    if total != size or first > last or last >= size:
+        raise ValidationError({'Content-Range': f'Range must lie within the {size} byte upload.'})
+    return first, last - first + 1
+
+
+def append_chunk(upload, stream, start, length):
+    """Write up to length bytes of stream at start and advance upload.offset."""
+    if start != upload.offset:
+        raise UploadConflict(upload.offset)
+
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # another request is writing this upload right now
+            raise UploadConflict(upload.offset)
+        # the offset may have moved while we waited for the request body
+        upload.refresh_from_db(fields=['offset', 'media'])
+        if start != upload.offset or upload.media_id is not None:
+            raise UploadConflict(upload.offset)
+        handle.seek(start)
+        # drop anything a previous, unacknowledged attempt left past the offset
+        handle.truncate()
+        remaining = length
+        try:
+            while remaining:
+                data = stream.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                handle.write(data)
+                remaining -= len(data)
+        except OSError:
+            # client went away mid-chunk: keep what arrived so it can resume from there
+            pass
+        received = handle.tell()
+
+    # a concurrent PATCH for the same range loses here instead of corrupting the offset
+    claimed = VideoUpload.objects.filter(pk=upload.pk, offset=start).update(
+        offset=received, updated_at=timezone.now()
+    )
+    upload.refresh_from_db(fields=['offset', 'updated_at'])
+    if not claimed:
+        raise UploadConflict(upload.offset)
+    finish_upload(upload)
+    return upload
+
+
+def finish_upload(upload):
+    """Complete an upload whose bytes are all in but that has no MediaProperty yet.
+
+    Also how a completion that failed earlier (storage or database error) is retried.
+    """
+    if upload.offset != upload.size or upload.media_id is not None:
+        return upload
+    try:
+        handle = open(partial_path(upload), 'rb')
+    except FileNotFoundError:
+        # already moved into storage by another request
+        upload.refresh_from_db(fields=['media'])
+        return upload
+    with handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return upload
+        upload.refresh_from_db(fields=['offset', 'media'])
+        if upload.media_id is None:
+            complete_upload(upload)
+    return upload
+
+
+def complete_upload(upload):
+    """Move the assembled file into storage and attach it to a new MediaProperty."""
+    path = partial_path(upload)
+    media = MediaProperty(property_id=upload.property_id)
+    with open(path, 'rb') as handle:
+        media.videos.save(upload.filename, PartialFile(handle, path), save=False)
+    try:
+        with transaction.atomic():
+            media.save()
+            upload.media = media
+            upload.save(update_fields=['media', 'updated_at'])
+    except Exception:
+        # hand the bytes back to the partial file so completion can be retried
+        upload.media = None
+        if os.path.exists(path):
+            media.videos.delete(save=False)
+        else:
+            file_move_safe(media.videos.path, path)
+        raise
+    discard_partial(upload)
+    return media
+
+
+def expire_uploads(now=None):
+    """Delete unfinished uploads idle for PROPERTY_UPLOAD_EXPIRY_HOURS, and orphaned partial files.
+
+    Returns the number of upload sessions removed.
+    """
+    cutoff = (now or timezone.now()) - datetime.timedelta(hours=getattr(settings, 'PROPERTY_UPLOAD_EXPIRY_HOURS', 24))
+    stale = list(VideoUpload.objects.filter(media__isnull=True, updated_at__lt=cutoff))
+    for upload in stale:
+        discard_partial(upload)
+    VideoUpload.objects.filter(pk__in=[upload.pk for upload in stale]).delete()
+
+    # partial files whose session is gone (deleted rows, crashes between steps)
+    try:
+        names = os.listdir(settings.PROPERTY_UPLOAD_TEMP_DIR)
+    except FileNotFoundError:
+        names = []
+    live = {f'{pk}.part' for pk in VideoUpload.objects.filter(media__isnull=True).values_list('pk', flat=True)}
+    for name in names:
+        path = os.path.join(settings.PROPERTY_UPLOAD_TEMP_DIR, name)
+        if name.endswith('.part') and name not in live and os.path.getmtime(path) < cutoff.timestamp():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return len(stale)
+
+
+def discard_partial(upload):
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
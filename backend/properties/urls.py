@@ -1,12 +1,27 @@
 from django.urls import path
 from .views import (
     PropertyVisitListCreateView, PropertyVisitRetrieveUpdateDestroyView,
-    PropertyListCreateView, PropertyRetrieveUpdateDestroyView
+    PropertyListCreateView, PropertyRetrieveUpdateDestroyView, PropertyFacetsView,
+    PropertyClustersView, PropertyExportView, PropertyFeaturedView, PropertyTileView, PropertySimilarView, MarketStatListView,
+    PropertyAvailabilityView, SavedSearchListCreateView, SavedSearchRetrieveUpdateDestroyView, VideoUploadCreateView, VideoUploadView
 )
 
 urlpatterns = [
     path('', PropertyListCreateView.as_view(), name='property-list-create'),
+    path('facets/', PropertyFacetsView.as_view(), name='property-facets'),
+    path('featured/', PropertyFeaturedView.as_view(), name='property-featured'),
+    path('market-stats/', MarketStatListView.as_view(), name='property-market-stats'),
+    path('clusters/', PropertyClustersView.as_view(), name='property-clusters'),
+    path('export.geojson', PropertyExportView.as_view(), name='property-export-geojson'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', PropertyTileView.as_view(), name='property-tile'),
     path('<int:pk>/', PropertyRetrieveUpdateDestroyView.as_view(), name='property-retrieve-update-destroy'),
+    path('<int:pk>/availability/', PropertyAvailabilityView.as_view(), name='property-availability'),
+    path('<int:pk>/similar/', PropertySimilarView.as_view(), name='property-similar'),
+    path('<int:pk>/videos/uploads/', VideoUploadCreateView.as_view(), name='property-video-upload-create'),
+    path('videos/uploads/<uuid:pk>/', VideoUploadView.as_view(), name='property-video-upload'),
+
+    path('saved-searches/', SavedSearchListCreateView.as_view(), name='savedsearch-list-create'),
+    path('saved-searches/<int:pk>/', SavedSearchRetrieveUpdateDestroyView.as_view(), name='savedsearch-retrieve-update-destroy'),
 
     path('visits/', PropertyVisitListCreateView.as_view(), name='propertyvisit-list-create'),
     path('visits/<int:pk>/', PropertyVisitRetrieveUpdateDestroyView.as_view(), name='propertyvisit-retrieve-update-destroy'),
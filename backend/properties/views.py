@@ -1,13 +1,123 @@
-from rest_framework import generics, permissions
-from .models import PropertyVisit, Property
-from .serializers import PropertyVisitSerializer, SerializerProperty
+import datetime
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from utils.pagination import KeysetPagination
+from .models import MarketStat, PropertyVisit, Property, SavedSearch, VideoUpload
+from .serializers import (
+    MarketStatSerializer, PropertyVisitSerializer, SerializerProperty, PropertyCardSerializer,
+    SavedSearchSerializer, VideoUploadSerializer,
+)
+from .filters import apply_attribute_filters, filter_properties, parse_bbox, parse_int
+from .clusters import get_clusters
+from .facets import get_facets
+from .export import geojson_chunks
+from .featured import get_featured
+from .search import MAX_RESULTS, apply_search
+from .tiles import get_tile, valid_tile
+from .similar import DEFAULT_NEIGHBOURS, MAX_NEIGHBOURS, similar_index
+from .cache import detail_cache_key, list_cache_key, list_version
+from .counters import view_counter
+from .conditional import (
+    detail_updated_at, detail_validators, list_stats, list_validators, not_modified, set_validators,
+)
+from .visits import MAX_AVAILABILITY_DAYS, filter_visit_range, free_slots, visible_visits, visit_duration
+from .uploads import UploadConflict, append_chunk, discard_partial, finish_upload, parse_content_range
+from django.core.cache import cache
 from rest_framework.permissions import IsAuthenticated
 
 
+class SearchPagination(LimitOffsetPagination):
+    """Limit/offset pages over ranked ?q= results, capped at PROPERTY_SEARCH_MAX_RESULTS."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # the cap applies after every filter, so narrower searches never lose matches
+        return super().paginate_queryset(queryset[:MAX_RESULTS], request, view)
+
+
 class PropertyListCreateView(generics.ListCreateAPIView):
-    queryset = Property.objects.all().order_by('-created_at')
+    queryset = Property.objects.all()
     serializer_class = SerializerProperty
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        # Keyset pages follow (created_at, id); distance-ordered and ranked search
+        # results are bounded (radius_km, PROPERTY_SEARCH_MAX_RESULTS), so they keep
+        # plain limit/offset paging.
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('q'):
+                self._paginator = SearchPagination()
+            elif params.get('ordering') == 'distance':
+                self._paginator = LimitOffsetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def is_card_view(self):
+        return self.request.method == 'GET' and self.request.query_params.get('view') == 'card'
+
+    def requested_fields(self):
+        # ?fields=id,title,price selects a sparse fieldset of SerializerProperty
+        value = self.request.query_params.get('fields') if self.request.method == 'GET' else None
+        return [name.strip() for name in value.split(',') if name.strip()] if value else None
+
+    def get_serializer_class(self):
+        return PropertyCardSerializer if self.is_card_view() else super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields and not self.is_card_view():
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        if self.request.method != 'GET':
+            return super().get_queryset()
+        if self.is_card_view():
+            queryset = Property.objects.for_cards()
+        else:
+            queryset = Property.objects.with_listing_data(self.requested_fields())
+        return self.filter_listing(queryset.order_by('-created_at'))
+
+    def filter_listing(self, queryset, order=True):
+        # attribute filters plus ?near=lat,lng&radius_km=, ?bbox= and ?ordering=distance (see filters.py)
+        params = self.request.query_params
+        queryset, by_distance = filter_properties(queryset, params)
+        if params.get('q'):
+            # ranked full-text search over the FTS5 index (see search.py)
+            queryset = apply_search(queryset, params['q'], order=order and not by_distance)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Only first pages are cached; deeper pages are cheap keyset seeks anyway.
+        # The validator inputs are cached with the page, so a hit never queries.
+        paged = 'cursor' in request.query_params or 'offset' in request.query_params
+        key = None if paged else list_cache_key(request)
+        cached = cache.get(key) if key else None
+        if cached is None:
+            stats = list_stats(self.filter_listing(Property.objects.all(), order=False))
+        else:
+            stats = cached['stats']
+        etag, last_modified = list_validators(request, stats)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        if cached is not None:
+            response = Response(cached['data'])
+        else:
+            response = super().list(request, *args, **kwargs)
+            if key:
+                cache.set(key, {'data': response.data, 'stats': stats})
+        return set_validators(response, etag, last_modified)
 
     def perform_create(self, serializer):
         # set owner to request user if authenticated
@@ -24,14 +134,257 @@ class PropertyRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = SerializerProperty
     permission_classes = [permissions.AllowAny]
 
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            return Property.objects.with_listing_data()
+        # writes replace media/features, so the annotated main image would be stale
+        return super().get_queryset()
+
+    def retrieve(self, request, *args, **kwargs):
+        key = detail_cache_key(request, kwargs['pk'])
+        cached = cache.get(key)
+        if cached is None:
+            updated_at = detail_updated_at(Property.objects.all(), kwargs['pk'])
+        else:
+            updated_at = cached['updated_at']
+        etag, last_modified = detail_validators(request, kwargs['pk'], updated_at)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            if cached is None:
+                response = super().retrieve(request, *args, **kwargs)
+                cache.set(key, {'data': response.data, 'updated_at': updated_at})
+            else:
+                response = Response(cached['data'])
+        # buffered, flushed in batches (see counters.py)
+        view_counter.record(kwargs['pk'])
+        return set_validators(response, etag, last_modified)
+
+
+class PropertyFacetsView(generics.GenericAPIView):
+    """Counts per type, city, status, bedroom and price bucket for the current filters."""
+    queryset = Property.objects.all()
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        queryset, _ = filter_properties(self.get_queryset(), params)
+        if params.get('q'):
+            # same matches as the ?q= list the facets sit beside
+            queryset = apply_search(queryset, params['q'], order=False)
+        return Response(get_facets(queryset, params))
+
+
+class PropertyFeaturedView(generics.GenericAPIView):
+    """Currently featured, published listings in ranked order, served from cache."""
+    queryset = Property.objects.all()
+    serializer_class = PropertyCardSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        queryset = Property.objects.for_cards()
+        return Response({'results': get_featured(queryset, self.get_serializer_class())})
+
+
+class PropertySimilarView(generics.GenericAPIView):
+    """The ?k= published listings most like this one (see similar.py)."""
+    queryset = Property.objects.all()
+    serializer_class = PropertyCardSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk, *args, **kwargs):
+        k = request.query_params.get('k')
+        k = max(1, min(parse_int(k, 'k'), MAX_NEIGHBOURS)) if k else DEFAULT_NEIGHBOURS
+        key = f'property-similar:{list_version()}:{pk}:{k}'
+        data = cache.get(key)
+        if data is None:
+            ids = similar_index.neighbours(pk, k)
+            if ids is None:
+                raise NotFound('No published property with this id.')
+            cards = Property.objects.for_cards().in_bulk(ids)
+            data = self.get_serializer([cards[i] for i in ids if i in cards], many=True).data
+            cache.set(key, data)
+        return Response({'results': data})
+
+
+class MarketStatListView(generics.ListAPIView):
+    """Price per m² quartiles by city and type, read from the materialized MarketStat table."""
+    serializer_class = MarketStatSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = MarketStat.objects.all()
+        for param in ('city', 'type'):
+            if self.request.query_params.get(param):
+                queryset = queryset.filter(**{param: self.request.query_params[param]})
+        return queryset
+
+
+class PropertyClustersView(generics.GenericAPIView):
+    """Map clusters for ?bbox=&zoom=, grouped on geohash prefixes and cached per tile.
+
+    Published listings only unless ?is_published= says otherwise; listings still
+    at the DEFAULT_LOCATION placeholder have no position to cluster.
+    """
+    queryset = Property.objects.all()
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        bbox = parse_bbox(params.get('bbox'))
+        zoom = parse_int(params.get('zoom'), 'zoom')
+        if not 0 <= zoom <= 22:
+            raise ValidationError({'zoom': 'Must be between 0 and 22.'})
+        queryset = self.get_queryset().placed()
+        if not params.get('is_published'):
+            queryset = queryset.filter(is_published=True)
+        queryset = apply_attribute_filters(queryset, params)
+        return Response(get_clusters(queryset, params, bbox, zoom))
+
+
+class PropertyExportView(generics.GenericAPIView):
+    """Published listings matching the attribute filters as a streamed GeoJSON FeatureCollection."""
+    queryset = Property.objects.filter(is_published=True)
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        queryset = apply_attribute_filters(self.get_queryset(), request.query_params)
+        response = StreamingHttpResponse(geojson_chunks(queryset), content_type='application/geo+json')
+        response['Content-Disposition'] = 'attachment; filename="properties.geojson"'
+        return response
+
+
+class PropertyTileView(generics.GenericAPIView):
+    """Published listings in one XYZ map tile as a Mapbox vector tile, cached on disk (see tiles.py)."""
+    queryset = Property.objects.filter(is_published=True)
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, z, x, y, *args, **kwargs):
+        if not valid_tile(z, x, y):
+            raise NotFound('No such tile.')
+        return HttpResponse(get_tile(self.get_queryset(), z, x, y), content_type='application/vnd.mapbox-vector-tile')
+
+
+class VideoUploadCreateView(generics.CreateAPIView):
+    """Open a chunked video upload for a property (see uploads.py)."""
+    serializer_class = VideoUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        prop = get_object_or_404(Property, pk=self.kwargs['pk'])
+        if prop.owner_id != self.request.user.id and not self.request.user.is_staff:
+            raise PermissionDenied('Only the owner can add videos to this property.')
+        serializer.save(owner=self.request.user, property=prop)
+
+
+class VideoUploadView(generics.GenericAPIView):
+    """GET/HEAD report the received offset, PATCH appends a byte range, DELETE abandons the upload."""
+    serializer_class = VideoUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return VideoUpload.objects.filter(owner=self.request.user)
+
+    def offset_response(self, upload, status_code=status.HTTP_200_OK):
+        response = Response(self.get_serializer(upload).data, status=status_code)
+        response['Upload-Offset'] = str(upload.offset)
+        response['Upload-Length'] = str(upload.size)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        # retries a completion that failed after the last byte was stored
+        return self.offset_response(finish_upload(self.get_object()))
+
+    def patch(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.media_id is not None:
+            return self.offset_response(upload, status.HTTP_409_CONFLICT)
+        if upload.offset == upload.size:
+            # every byte is in; an (empty) PATCH only retries the completion
+            return self.offset_response(finish_upload(upload))
+        start, length = parse_content_range(request.headers.get('Content-Range'), upload.size)
+        # read the raw body as a stream; request.data would buffer the whole chunk
+        try:
+            append_chunk(upload, request.stream, start, length)
+        except UploadConflict:
+            return self.offset_response(upload, status.HTTP_409_CONFLICT)
+        return self.offset_response(upload)
+
+    def delete(self, request, *args, **kwargs):
+        upload = self.get_object()
+        discard_partial(upload)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class PropertyVisitListCreateView(generics.ListCreateAPIView):
+
+class SavedSearchListCreateView(generics.ListCreateAPIView):
+    """The current user's saved searches; matches are delivered as notifications (see alerts.py)."""
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class SavedSearchRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+
+class PropertyAvailabilityView(generics.GenericAPIView):
+    """Open visit slots of a property for ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: the next 7 days)."""
+    queryset = Property.objects.all()
+    permission_classes = [permissions.AllowAny]
+
+    def parse_date(self, param, default):
+        value = self.request.query_params.get(param)
+        if not value:
+            return default
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({param: 'Expected YYYY-MM-DD.'})
+
+    def get(self, request, pk, *args, **kwargs):
+        if not Property.objects.filter(pk=pk).exists():
+            raise NotFound('Property not found.')
+        first = self.parse_date('from', timezone.localdate())
+        last = self.parse_date('to', first + datetime.timedelta(days=6))
+        if last < first:
+            raise ValidationError({'to': "Must not be before 'from'."})
+        if (last - first).days >= MAX_AVAILABILITY_DAYS:
+            raise ValidationError({'to': f'At most {MAX_AVAILABILITY_DAYS} days per request.'})
+        return Response({
+            'duration_minutes': int(visit_duration().total_seconds() // 60),
+            'slots': [slot.isoformat() for slot in free_slots(pk, first, last)],
+        })
+
+
+class VisitScopeMixin:
+    """Visits the user takes part in: as the visitor or as the owner of the property."""
+
+    def get_queryset(self):
+        return visible_visits(self.request.user).select_related('property', 'visitor')
+
+
+class PropertyVisitListCreateView(VisitScopeMixin, generics.ListCreateAPIView):
+    """The user's visit calendar, optionally limited to ?from=&to= (dates or ISO datetimes)."""
     queryset = PropertyVisit.objects.all()
     serializer_class = PropertyVisitSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        params = self.request.query_params
+        return filter_visit_range(super().get_queryset(), params.get('from'), params.get('to'))
+
 
-class PropertyVisitRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class PropertyVisitRetrieveUpdateDestroyView(VisitScopeMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = PropertyVisit.objects.all()
     serializer_class = PropertyVisitSerializer
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,129 @@
+"""Visit scheduling: conflict checks and open slots per property.
+
+A visit occupies [scheduled_time, scheduled_time + duration). Two visits of one
+property conflict when their start times are less than one duration apart, so
+both checks are range scans on the (property, scheduled_time) index that only
+read the visits near the times asked about.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import OperationalError
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import Property, PropertyVisit
+
+# Visits that hold their slot
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+MAX_AVAILABILITY_DAYS = 31
+
+
+def visit_duration():
+    return datetime.timedelta(minutes=getattr(settings, 'PROPERTY_VISIT_DURATION_MINUTES', 30))
+
+
+def active_visits(property_id, start, end):
+    """Active visits of a property starting in [start, end)."""
+    return PropertyVisit.objects.filter(
+        property_id=property_id, status__in=ACTIVE_STATUSES,
+        scheduled_time__gte=start, scheduled_time__lt=end,
+    )
+
+
+def find_conflict(property_id, when, exclude_pk=None):
+    """Return an active visit overlapping a visit starting at when, or None."""
+    duration = visit_duration()
+    visits = active_visits(property_id, when - duration + datetime.timedelta(microseconds=1), when + duration)
+    if exclude_pk is not None:
+        visits = visits.exclude(pk=exclude_pk)
+    return visits.order_by('scheduled_time').first()
+
+
+def lock_property(property_id):
+    """Serialize bookings of one property until the current transaction ends.
+
+    A no-op UPDATE of the property row. PostgreSQL and MySQL lock the row;
+    SQLite, where select_for_update() does nothing, takes its database write
+    lock. Issued before the conflict check reads, a concurrent booking waits
+    here and then sees the visit this one stored. If the lock can't be had
+    within the database timeout the booking is refused with a 400.
+    """
+    try:
+        Property.objects.filter(pk=property_id).update(id=F('id'))
+    except OperationalError:
+        raise ValidationError({'scheduled_time': 'This property is being booked right now; please try again.'})
+
+
+def free_slots(property_id, first_day, last_day, now=None):
+    """Start times of bookable slots between two dates (inclusive), in the current time zone."""
+    duration = visit_duration()
+    now = now or timezone.now()
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min), tz)
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min), tz)
+
+    busy = list(
+        active_visits(property_id, start - duration, end)
+        .order_by('scheduled_time').values_list('scheduled_time', flat=True)
+    )
+    day_start = getattr(settings, 'PROPERTY_VISIT_DAY_START', 8)
+    day_end = getattr(settings, 'PROPERTY_VISIT_DAY_END', 18)
+
+    slots, index = [], 0
+    day = first_day
+    while day <= last_day:
+        slot = timezone.make_aware(datetime.datetime.combine(day, datetime.time(day_start)), tz)
+        closing = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz) + datetime.timedelta(hours=day_end)
+        while slot + duration <= closing:
+            # busy is sorted: skip visits that ended before this slot starts
+            while index < len(busy) and busy[index] + duration <= slot:
+                index += 1
+            taken = index < len(busy) and busy[index] < slot + duration
+            if slot >= now and not taken:
+                slots.append(slot)
+            slot += duration
+        day += datetime.timedelta(days=1)
+    return slots
+
+
+def visible_visits(user):
+    """Visits of user as visitor or as property owner (everything for staff).
+
+    Both branches of the OR are index lookups: (visitor, scheduled_time) and,
+    through the owner's property ids, (property, scheduled_time).
+    """
+    if user.is_staff:
+        return PropertyVisit.objects.all()
+    owned = Property.objects.filter(owner=user).values('pk')
+    return PropertyVisit.objects.filter(Q(visitor=user) | Q(property__in=owned))
+
+
+def parse_bound(value, param, end=False):
+    """Parse a ?from= / ?to= value; a bare date covers that whole day."""
+    moment = parse_datetime(value)
+    if moment is None:
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({param: 'Expected a date (YYYY-MM-DD) or an ISO 8601 datetime.'})
+        if end:
+            day += datetime.timedelta(days=1)
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_visit_range(queryset, start=None, end=None):
+    """Restrict visits to scheduled_time in [start, end)."""
+    if start:
+        queryset = queryset.filter(scheduled_time__gte=parse_bound(start, 'from'))
+    if end:
+        queryset = queryset.filter(scheduled_time__lt=parse_bound(end, 'to', end=True))
+    return queryset
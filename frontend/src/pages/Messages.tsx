@@ -43,6 +43,22 @@ interface Message {
   created_at: string;
 }
 
+// One page of a conversation: chronological, `next` points at the page of older messages
+interface MessagePage {
+  next: string | null;
+  previous: string | null;
+  results: Message[];
+}
+
+// Merge pages into one chronological list without duplicates
+const mergeMessages = (current: Message[], incoming: Message[]) => {
+  const byId = new Map(current.map((msg) => [msg.id, msg]));
+  incoming.forEach((msg) => byId.set(msg.id, msg));
+  return Array.from(byId.values()).sort(
+    (a, b) => new Date(a.created_at).getTime() - new Date(b.created_at).getTime() || a.id - b.id
+  );
+};
+
 export default function Messages() {
   const { user } = useAuth();
   const { toast } = useToast();
@@ -55,6 +71,8 @@ export default function Messages() {
   const [messagesLoading, setMessagesLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [messagesError, setMessagesError] = useState<string | null>(null);
+  const [olderMessagesUrl, setOlderMessagesUrl] = useState<string | null>(null);
+  const [olderLoading, setOlderLoading] = useState(false);
 
   const fetchConversations = async () => {
     if (!user) return;
@@ -83,12 +101,14 @@ export default function Messages() {
 
   // Fetch messages for selected conversation
   useEffect(() => {
-    const fetchMessages = async (convId: number) => {
-      setMessagesLoading(true);
+    // The endpoint returns the latest page; polling merges it so older pages already loaded stay visible
+    const fetchMessages = async (convId: number, initial = false) => {
+      if (initial) setMessagesLoading(true);
       setMessagesError(null);
       try {
-        const response = await api.get<{ results: Message[] }>(`/messaging/conversations/${convId}/messages/`);
-        setMessages(response.data.results || []);
+        const response = await api.get<MessagePage>(`/messaging/conversations/${convId}/messages/`);
+        setMessages(prev => mergeMessages(prev, response.data.results || []));
+        if (initial) setOlderMessagesUrl(response.data.next);
         await markMessagesAsRead(convId);
       } catch (err) {
         setMessagesError("Failed to load messages for this conversation.");
@@ -98,12 +118,28 @@ export default function Messages() {
       }
     };
     if (selectedConversationId) {
-      fetchMessages(selectedConversationId);
+      setMessages([]);
+      setOlderMessagesUrl(null);
+      fetchMessages(selectedConversationId, true);
       const interval = setInterval(() => fetchMessages(selectedConversationId), 5000); // Poll for new messages
       return () => clearInterval(interval);
     }
   }, [selectedConversationId, user]); // Added user to dependencies
 
+  const loadOlderMessages = async () => {
+    if (!olderMessagesUrl) return;
+    setOlderLoading(true);
+    try {
+      const response = await api.get<MessagePage>(olderMessagesUrl);
+      setMessages(prev => mergeMessages(prev, response.data.results || []));
+      setOlderMessagesUrl(response.data.next);
+    } catch (err) {
+      console.error("Failed to load older messages:", err);
+    } finally {
+      setOlderLoading(false);
+    }
+  };
+
   const markMessagesAsRead = async (convId: number) => {
     if (!user) return;
     try {
@@ -129,8 +165,8 @@ export default function Messages() {
       });
       setNewMessage("");
       // Refetch messages to show the new one
-      const response = await api.get<{ results: Message[] }>(`/messaging/conversations/${selectedConversationId}/messages/`);
-      setMessages(response.data.results || []);
+      const response = await api.get<MessagePage>(`/messaging/conversations/${selectedConversationId}/messages/`);
+      setMessages(prev => mergeMessages(prev, response.data.results || []));
       fetchConversations(); // Update conversation list (e.g., last message)
     } catch (err) {
       console.error("Error sending message:", error);
@@ -268,6 +304,13 @@ export default function Messages() {
                       <p className="text-red-500">{messagesError}</p>
                     ) : (
                       <div className="space-y-4">
+                        {olderMessagesUrl && (
+                          <div className="flex justify-center">
+                            <Button variant="ghost" size="sm" onClick={loadOlderMessages} disabled={olderLoading}>
+                              {olderLoading ? "Loading..." : "Load older messages"}
+                            </Button>
+                          </div>
+                        )}
                         {messages.map((message) => (
                           <div
                             key={message.id}